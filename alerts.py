@@ -0,0 +1,171 @@
+# backend/alerts.py
+"""Пакетне формування сповіщень про початок цвітіння та несприятливу погоду біля пасік"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+# Пороги погодних попереджень: нижче LOW_TEMP °C бджоли майже не літають (див. weather.bee_activity_level),
+# вітер від HIGH_WIND м/с і опади від RAIN_MM мм за день обмежують роботи на пасіці
+LOW_TEMP = 10
+HIGH_WIND = 8
+RAIN_MM = 1
+
+WEATHER_TITLES = {
+    'rain': 'Прогноз: дощ',
+    'cold': 'Прогноз: похолодання',
+    'wind': 'Прогноз: сильний вітер'
+}
+
+
+def notification_id(key):
+    """Стабільний id сповіщення за ключем події - повторний запуск не створює дублікатів"""
+    return hashlib.sha1(f'beeplanner:{key}'.encode('utf-8')).hexdigest()[:32]
+
+
+def weather_warnings(day):
+    """Попередження для дня прогнозу (див. weather.daily_forecast): [(вид, текст)]"""
+    warnings = []
+    if day['precipitation'] >= RAIN_MM or 'rain' in day['condition']:
+        warnings.append(('rain', f"очікується дощ ({day['precipitation']} мм), обмежте роботи з бджолами"))
+    if day['temp_day'] < LOW_TEMP:
+        warnings.append(('cold', f"денна температура до {day['temp_day']}°C, бджоли майже не літатимуть"))
+    if day['wind_speed'] >= HIGH_WIND:
+        warnings.append(('wind', f"вітер {day['wind_speed']} м/с, відкладіть огляди вуликів"))
+    return warnings
+
+
+def _apiary_names(apiaries, shown=3):
+    names = [a.get('name') or 'Пасіка' for a in apiaries[:shown]]
+    rest = len(apiaries) - shown
+    return ', '.join(names) + (f' та ще {rest}' if rest > 0 else '')
+
+
+def build_notifications(apiaries, upcoming, forecasts, cell_of, forage_plants, now):
+    """Сповіщення власникам пасік - по одному на користувача й подію.
+
+    upcoming - [(через скільки днів, рослина)] з календаря цвітіння; forecasts -
+    {клітинка: [дні прогнозу]}; cell_of(пасіка) - клітинка погоди або None;
+    forage_plants(пасіка) - id медоносів у радіусі льоту або None, якщо даних про
+    угіддя поблизу немає (тоді діє весь календар).
+
+    Погода оцінюється один раз на клітинку, цвітіння - один раз на рослину, тож
+    перехресний добуток пасік і подій зводиться до пошуку в словниках.
+    """
+    cell_warnings = {}
+    for cell, days in forecasts.items():
+        cell_warnings[cell] = [(day['date'], kind, text) for day in days for kind, text in weather_warnings(day)]
+
+    weather_hits, bloom_hits = {}, {}
+    for apiary in apiaries:
+        owner = apiary.get('user_id')
+        if owner is None:
+            continue
+        for date, kind, text in cell_warnings.get(cell_of(apiary), ()):
+            weather_hits.setdefault((owner, date, kind), (text, []))[1].append(apiary)
+        if upcoming:
+            present = forage_plants(apiary)
+            for days_until, plant in upcoming:
+                if present is None or plant.get('id') in present:
+                    bloom_hits.setdefault((owner, plant.get('id'), days_until), (plant, []))[1].append(apiary)
+
+    created_at = now.isoformat()
+    starts = {days_until: (now + timedelta(days=days_until)).date() for days_until, _ in upcoming}
+    notifications = []
+    for (owner, date, kind), (text, hit) in weather_hits.items():
+        notifications.append({
+            'id': notification_id(f'weather:{owner}:{kind}:{date}'),
+            'user_id': owner,
+            'type': 'warning',
+            'category': 'weather',
+            'title': WEATHER_TITLES[kind],
+            'message': f'{date[8:10]}.{date[5:7]}: {text}. Пасіки: {_apiary_names(hit)}',
+            'event_date': date,
+            'apiary_ids': [a.get('id') for a in hit],
+            'is_read': False,
+            'created_at': created_at
+        })
+    for (owner, plant_id, days_until), (plant, hit) in bloom_hits.items():
+        start = starts[days_until]
+        notifications.append({
+            'id': notification_id(f'bloom:{owner}:{plant_id}:{start.isoformat()}'),
+            'user_id': owner,
+            'type': 'info',
+            'category': 'bloom',
+            'title': f"Початок цвітіння: {plant.get('name')}",
+            'message': f"{plant.get('name')} почне цвісти {start.strftime('%d.%m')} (через {days_until} дн.) "
+                       f"біля пасік: {_apiary_names(hit)}",
+            'event_date': start.isoformat(),
+            'apiary_ids': [a.get('id') for a in hit],
+            'is_read': False,
+            'created_at': created_at
+        })
+    return notifications
+
+
+class BatchJob:
+    """Фоновий потік, що запускає run() раз на interval секунд (перший запуск - через delay).
+
+    Якщо задано leader (storage.LeaderLock), за розкладом запускає лише процес-лідер;
+    run_once() (позачерговий запуск) працює в будь-якому процесі.
+    """
+
+    def __init__(self, run, interval=3600, delay=60, name='batch-job', leader=None):
+        self.run = run
+        self.interval = interval
+        self.delay = delay
+        self.name = name
+        self.leader = leader
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.errors = 0
+        self.last_result = None
+        self.last_run_seconds = None
+
+    def run_once(self):
+        started = time.time()
+        try:
+            self.last_result = self.run()
+            return self.last_result
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Помилка фонового завдання {self.name}: {e}")
+            raise
+        finally:
+            self.runs += 1
+            self.last_run_seconds = round(time.time() - started, 3)
+
+    def _run(self):
+        wait = self.delay
+        while not self._stop.wait(wait):
+            try:
+                if self.leader is None or self.leader.acquire():
+                    self.run_once()
+            except Exception:
+                pass
+            wait = self.interval
+
+    def start(self):
+        """Запускає потік (повторні виклики нічого не роблять)"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'leader': self.leader is None or self.leader.held,
+            'interval': self.interval,
+            'runs': self.runs,
+            'errors': self.errors,
+            'last_run_seconds': self.last_run_seconds,
+            'last_result': self.last_result
+        }
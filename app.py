@@ -2,28 +2,168 @@ import hashlib
 import json
 import os
 import random
+import time
 import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
-import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+from alerts import BatchJob, build_notifications
+from bloom import (DAYS_IN_YEAR, BloomIndex, date_day_of_year, date_in_year, day_of_year,
+                   format_day_of_year, parse_bloom_period, parse_day_month)
+from events import EventHub, format_sse
+from matching import hives_for_area, rank_beekeepers, window_label
+from schema import (AGGREGATES, APIARIES_FILE, COOPERATION_FILE, GEO_INDEXES, HONEY_PLANTS_FILE, JOURNAL_FILE,
+                    JOURNAL_LOG_FILE, JSON_INDEXES, LAYERS_FILE, LOCATIONS_FILE, NOTIFICATIONS_FILE,
+                    NOTIFICATIONS_LOG_FILE, REVIEWS_FILE, ROUTES_FILE, SQLITE_PATH, SQLITE_TABLES, USERS_FILE,
+                    VERIFICATIONS_FILE)
+from spatial import ForageAnalyzer, circle_overlap_fraction, record_point
+from storage import (DataStore, DeferredUpdates, JournalLog, JsonBackend, LeaderLock, SqliteBackend, copy_records,
+                     decode_cursor, encode_cursor, time_key)
+from weather import (BackgroundRefresher, CircuitBreaker, SharedCache, SingleFlight, TTLCache, bee_activity_level,
+                     create_http_session, daily_forecast, weather_cell)
+
 app = Flask(__name__)
 CORS(app)
 
-# Файли для зберігання даних
-USERS_FILE = 'users.json'
-APIARIES_FILE = 'apiaries.json'
-JOURNAL_FILE = 'journal.json'
-VERIFICATIONS_FILE = 'verifications.json'
-REVIEWS_FILE = 'reviews.json'
-LAYERS_FILE = 'layers.json'
-HONEY_PLANTS_FILE = 'honey_plants.json'
-NOTIFICATIONS_FILE = 'notifications.json'
-ROUTES_FILE = 'routes.json'
-COOPERATION_FILE = 'cooperation.json'
-LOCATIONS_FILE = 'locations.json'
+# Режим зберігання журналу: 'json' (весь файл) або 'jsonl' (append-only журнал)
+JOURNAL_STORAGE = os.environ.get('JOURNAL_STORAGE', 'json')
+JOURNAL_COMPACT_BYTES = int(os.environ.get('JOURNAL_COMPACT_BYTES', 1024 * 1024))
+
+# Режим зберігання сповіщень: 'json' (весь файл) або 'jsonl' (позначка «прочитано» - один дописаний рядок)
+NOTIFICATIONS_STORAGE = os.environ.get('NOTIFICATIONS_STORAGE', 'json')
+
+# Бекенд зберігання: 'json' (файли, для розробки) або 'sqlite' (база - schema.SQLITE_PATH)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+
+# Як часто (с) накопичені позначки активності користувачів (last_login) записуються у сховище
+ACTIVITY_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))
+
+# Максимальний розмір сторінки для ендпоінтів з пагінацією
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+
+# OpenWeatherMap: ключ, сітка округлення координат для кешу та терміни життя (с)
+WEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', '2d5269ffcc91aebf9cb1193ca0507537')
+WEATHER_API_URL = os.environ.get('OPENWEATHER_API_URL', 'https://api.openweathermap.org/data/2.5').rstrip('/')
+WEATHER_TIMEOUT = float(os.environ.get('WEATHER_TIMEOUT', 10))
+WEATHER_POOL_SIZE = int(os.environ.get('WEATHER_POOL_SIZE', 10))
+WEATHER_BATCH_LIMIT = int(os.environ.get('WEATHER_BATCH_LIMIT', 100))
+WEATHER_GRID_DEGREES = float(os.environ.get('WEATHER_GRID_DEGREES', 0.05))
+WEATHER_CURRENT_TTL = int(os.environ.get('WEATHER_CURRENT_TTL', 600))
+WEATHER_FORECAST_TTL = int(os.environ.get('WEATHER_FORECAST_TTL', 3600))
+WEATHER_CACHE_SIZE = int(os.environ.get('WEATHER_CACHE_SIZE', 1024))
+# Спільний для воркерів хоста кеш погоди (файл SQLite; порожнє значення - кеш лише в пам'яті процесу)
+WEATHER_SHARED_CACHE = os.environ.get('WEATHER_SHARED_CACHE', 'weather_cache.db')
+
+# Застарілі дані погоди віддаються одразу (не старші за WEATHER_STALE_TTL), а оновлюються у фоні.
+# Фоновий потік раз на WEATHER_REFRESH_INTERVAL с (0 - вимкнено) оновлює записи,
+# що прожили більше WEATHER_REFRESH_AHEAD частки свого TTL
+WEATHER_STALE_TTL = int(os.environ.get('WEATHER_STALE_TTL', 86400))
+WEATHER_REFRESH_INTERVAL = int(os.environ.get('WEATHER_REFRESH_INTERVAL', 60))
+WEATHER_REFRESH_AHEAD = float(os.environ.get('WEATHER_REFRESH_AHEAD', 0.8))
+
+# Фонові завдання (оновлення погоди, пакетні сповіщення) виконує один воркер на хост -
+# той, що захопив цей файл блокування
+BACKGROUND_LEADER_LOCK = os.environ.get('BACKGROUND_LEADER_LOCK', 'background_jobs.lock')
+
+# Запобіжник OpenWeatherMap: відкривається після WEATHER_BREAKER_FAILURES невдач поспіль
+# на WEATHER_BREAKER_RESET с. Запит користувача чекає на API не довше WEATHER_LATENCY_BUDGET с
+WEATHER_BREAKER_FAILURES = int(os.environ.get('WEATHER_BREAKER_FAILURES', 5))
+WEATHER_BREAKER_RESET = float(os.environ.get('WEATHER_BREAKER_RESET', 30))
+WEATHER_LATENCY_BUDGET = float(os.environ.get('WEATHER_LATENCY_BUDGET', 3))
+# Пакетний запит погоди виконується у власному пулі потоків і тримає в ньому не більше
+# WEATHER_BATCH_FANOUT запитів одночасно, щоб кілька пакетів ділили пул по черзі
+WEATHER_BATCH_FANOUT = int(os.environ.get('WEATHER_BATCH_FANOUT', WEATHER_POOL_SIZE))
+
+# Аналіз локації: сітка просторового індексу угідь, сітка кешу результатів (градуси),
+# термін життя кешу (с) і максимальний радіус (км)
+SPATIAL_GRID_DEGREES = float(os.environ.get('SPATIAL_GRID_DEGREES', 0.05))
+ANALYSIS_GRID_DEGREES = float(os.environ.get('ANALYSIS_GRID_DEGREES', 0.01))
+ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 3600))
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1024))
+ANALYSIS_MAX_RADIUS = float(os.environ.get('ANALYSIS_MAX_RADIUS', 20))
+
+# Пошук сусідніх пасік: максимальний радіус (км) і радіус льоту бджіл для перекриття зон (км)
+NEARBY_MAX_RADIUS = float(os.environ.get('NEARBY_MAX_RADIUS', 100))
+FORAGE_RADIUS_KM = float(os.environ.get('FORAGE_RADIUS_KM', 3))
+
+# Підбір пасічників для запилення: радіус пошуку за замовчуванням (км) і вуликів на гектар культури
+MATCH_RADIUS_KM = float(os.environ.get('MATCH_RADIUS_KM', 30))
+POLLINATION_HIVES_PER_HA = float(os.environ.get('POLLINATION_HIVES_PER_HA', 2.5))
+
+# Потік подій (SSE): інтервал keep-alive коментарів і перевірки змін інших воркерів (с),
+# тривалість з'єднання, після якої клієнт перепідключається з Last-Event-ID (с; має бути
+# меншою за graceful_timeout у gunicorn.conf.py), та пауза перед перепідключенням (мс)
+STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', 15))
+STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 60))
+STREAM_RETRY_MS = int(os.environ.get('STREAM_RETRY_MS', 3000))
+# created_at ставить записувач ще до того, як запис стане видимим, тож запис може
+# з'явитися «позаду» курсора потоку; стільки секунд за курсором потік переглядає повторно
+STREAM_GRACE_SECONDS = float(os.environ.get('STREAM_GRACE_SECONDS', 60))
+# Кожен потік займає потік воркера gthread, тож їх кількість на воркер обмежена значно нижче
+# за GUNICORN_THREADS (100), щоб REST API завжди мав вільні потоки; понад ліміт - 503
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 25))
+
+# Пакетні сповіщення про цвітіння та погоду: як часто запускати (с, 0 - вимкнено)
+# і за скільки днів попереджати про початок цвітіння
+NOTIFICATION_JOB_INTERVAL = int(os.environ.get('NOTIFICATION_JOB_INTERVAL', 3600))
+ALERT_BLOOM_DAYS = int(os.environ.get('ALERT_BLOOM_DAYS', 3))
+
+# Розібрані колекції живуть у пам'яті процесу між запитами
+data_store = DataStore(index_fields=JSON_INDEXES, aggregates=AGGREGATES, geo_fields=GEO_INDEXES)
+
+# Індекс цвітіння медоносів: (список каталогу, BloomIndex)
+bloom_index_cache = None
+
+# Аналізатор угідь: (вихідні колекції, ForageAnalyzer, кеш результатів за (клітинка, радіус))
+forage_analyzer_cache = None
+
+# Відповіді OpenWeatherMap за клітинками сітки: у пам'яті процесу та у спільному кеші хоста
+weather_shared_cache = SharedCache(WEATHER_SHARED_CACHE, max_age=WEATHER_STALE_TTL) if WEATHER_SHARED_CACHE else None
+weather_cache = TTLCache(WEATHER_CACHE_SIZE, shared=weather_shared_cache)
+
+# Прогноз по днях для пакетних сповіщень: {клітинка: (час запису відповіді API, дата розрахунку, daily_forecast)}
+forecast_days_cache = {}
+
+# Пул keep-alive з'єднань до OpenWeatherMap та потоки для паралельних запитів. Фонове
+# оновлення і пакетні запити мають власні потоки, щоб не затримувати запити однієї локації
+weather_http = create_http_session(3 * WEATHER_POOL_SIZE)
+weather_executor = ThreadPoolExecutor(max_workers=WEATHER_POOL_SIZE, thread_name_prefix='weather')
+weather_refresh_executor = ThreadPoolExecutor(max_workers=WEATHER_POOL_SIZE, thread_name_prefix='weather-refresh')
+weather_batch_executor = ThreadPoolExecutor(max_workers=WEATHER_POOL_SIZE, thread_name_prefix='weather-batch')
+
+# Однакові одночасні запити погоди чекають на один запит до API
+weather_flight = SingleFlight()
+
+# Поки OpenWeatherMap недоступне, запити до нього не виконуються
+weather_breaker = CircuitBreaker(WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET)
+
+# Будить потоки подій користувача, коли в нього з'являються сповіщення чи змінюються заявки
+event_hub = EventHub(max_streams=STREAM_MAX_CLIENTS)
+
+# Лідер фонових завдань серед воркерів хоста: оновлює погоду для пасік і формує сповіщення.
+# Без спільного кешу погоди прогнози є лише в пам'яті лідера, тож сповіщення формує він же
+background_leader = LeaderLock(BACKGROUND_LEADER_LOCK)
+
+# Фонове формування сповіщень для всіх пасік (запускається з першим запитом)
+notification_job = BatchJob(lambda: generate_notifications(), interval=NOTIFICATION_JOB_INTERVAL,
+                            name='notification-job', leader=background_leader)
+
+# Фонове оновлення погоди для пасік і нещодавно запитаних локацій (запускається з першим запитом погоди)
+weather_refresher = BackgroundRefresher(
+    lambda cell: refresh_weather_cell(cell),
+    lambda: apiary_weather_cells(),
+    interval=WEATHER_REFRESH_INTERVAL,
+    forget_after=WEATHER_STALE_TTL,
+    batch_size=WEATHER_BATCH_LIMIT,
+    leader=background_leader,
+    shared=weather_shared_cache,
+    # Кеш лише в пам'яті вміщує WEATHER_CACHE_SIZE записів (два на клітинку) - більше не оновлюємо
+    max_keys=None if weather_shared_cache is not None else WEATHER_CACHE_SIZE // 2
+)
 
 def utf8_response(func):
     """Декоратор для автоматичного додавання UTF-8 заголовків"""
@@ -54,26 +194,59 @@ def init_files():
 
 
 def load_data(filename):
-    """Завантажує дані з файлу"""
+    """Завантажує дані з резидентного сховища (файл читається лише після змін)"""
     try:
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+        return copy_records(data_store.get(filename))
     except:
         return []
 
 
 def save_data(filename, data):
-    """Зберігає дані у файл"""
+    """Зберігає дані у файл та оновлює резидентне сховище"""
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        data_store.put(filename, data)
         return True
     except:
         return False
 
 
+def open_log(filename, log_file):
+    """Append-only журнал колекції; створюється з JSON-файлу під час першого запуску"""
+    return JournalLog(log_file, seed_records=load_data(filename),
+                      compact_threshold=JOURNAL_COMPACT_BYTES,
+                      index_fields=JSON_INDEXES[filename],
+                      aggregates=AGGREGATES.get(filename))
+
+
+# Колекції, що ведуться в append-only журналах замість перезапису всього файлу
+json_logs = {}
+if STORAGE_BACKEND == 'json':
+    if JOURNAL_STORAGE == 'jsonl':
+        json_logs[JOURNAL_FILE] = open_log(JOURNAL_FILE, JOURNAL_LOG_FILE)
+    if NOTIFICATIONS_STORAGE == 'jsonl':
+        json_logs[NOTIFICATIONS_FILE] = open_log(NOTIFICATIONS_FILE, NOTIFICATIONS_LOG_FILE)
+
+db = JsonBackend(data_store, logs=json_logs)
+if STORAGE_BACKEND == 'sqlite':
+    db = SqliteBackend(SQLITE_PATH, SQLITE_TABLES, fallback=db, aggregates=AGGREGATES, geo_fields=GEO_INDEXES)
+
+# Час входу та інші позначки активності записуються пакетами, а не окремим записом файлу
+activity_updates = DeferredUpdates(db, ACTIVITY_FLUSH_INTERVAL)
+
+
+def get_page_params():
+    """Читає limit та cursor із запиту; ValueError, якщо limit невірний"""
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit')
+    if not limit:
+        return None, cursor
+
+    limit = int(limit)
+    if limit <= 0:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+
 def hash_password(password):
     """Хешує пароль"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -117,6 +290,26 @@ def test():
     })
 
 
+@app.route('/api/diagnostics', methods=['GET'])
+def diagnostics():
+    """Внутрішні лічильники сервера"""
+    return jsonify({
+        'success': True,
+        'backend': db.name,
+        'storage': data_store.stats(),
+        'journal_log': json_logs[JOURNAL_FILE].stats() if JOURNAL_FILE in json_logs else None,
+        'notifications_log': json_logs[NOTIFICATIONS_FILE].stats() if NOTIFICATIONS_FILE in json_logs else None,
+        'activity_updates': activity_updates.stats(),
+        'event_hub': event_hub.stats(),
+        'notification_job': notification_job.stats(),
+        'weather_cache': weather_cache.stats(),
+        'weather_single_flight': weather_flight.stats(),
+        'weather_breaker': weather_breaker.stats(),
+        'weather_refresher': weather_refresher.stats(),
+        'analysis_cache': forage_analyzer_cache[2].stats() if forage_analyzer_cache is not None else None
+    })
+
+
 # ==================== АВТЕНТИФІКАЦІЯ ====================
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -137,11 +330,8 @@ def register():
         if not full_name:
             return jsonify({'success': False, 'message': "Введіть повне ім'я"})
 
-        users = load_data(USERS_FILE)
-
-        for user in users:
-            if user['email'].lower() == email:
-                return jsonify({'success': False, 'message': 'Користувач з таким email вже існує'})
+        if db.find_one(USERS_FILE, email=email):
+            return jsonify({'success': False, 'message': 'Користувач з таким email вже існує'})
 
         new_user = {
             'id': str(uuid.uuid4()),
@@ -156,8 +346,9 @@ def register():
             'last_login': None
         }
 
-        users.append(new_user)
-        save_data(USERS_FILE, users)
+        # Перевірка email і запис виконуються атомарно, тож паралельні реєстрації не створять дублікатів
+        if db.insert_unique(USERS_FILE, new_user, 'email') is None:
+            return jsonify({'success': False, 'message': 'Користувач з таким email вже існує'})
 
         return jsonify({
             'success': True,
@@ -186,36 +377,57 @@ def login():
         if not email or not password:
             return jsonify({'success': False, 'message': 'Введіть email та пароль'})
 
-        users = load_data(USERS_FILE)
-
-        for user in users:
-            if user['email'].lower() == email:
-                if verify_password(password, user['password']):
-                    user['last_login'] = datetime.now().isoformat()
-                    save_data(USERS_FILE, users)
-
-                    return jsonify({
-                        'success': True,
-                        'message': 'Вхід успішний!',
-                        'user': {
-                            'id': user['id'],
-                            'email': user['email'],
-                            'full_name': user['full_name'],
-                            'user_type': user['user_type'],
-                            'phone': user.get('phone', ''),
-                            'is_verified': user.get('is_verified', False)
-                        }
-                    })
-                else:
-                    return jsonify({'success': False, 'message': 'Невірний пароль'})
-
-        return jsonify({'success': False, 'message': 'Користувача не знайдено'})
+        user = db.find_one(USERS_FILE, email=email)
+
+        if not user:
+            return jsonify({'success': False, 'message': 'Користувача не знайдено'})
+
+        if not verify_password(password, user['password']):
+            return jsonify({'success': False, 'message': 'Невірний пароль'})
+
+        activity_updates.set(USERS_FILE, user['id'], {'last_login': datetime.now().isoformat()})
+
+        return jsonify({
+            'success': True,
+            'message': 'Вхід успішний!',
+            'user': {
+                'id': user['id'],
+                'email': user['email'],
+                'full_name': user['full_name'],
+                'user_type': user['user_type'],
+                'phone': user.get('phone', ''),
+                'is_verified': user.get('is_verified', False)
+            }
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка сервера: {str(e)}'})
 
 
 # ==================== ПРОФІЛЬ ====================
+def build_profile(user):
+    """Профіль користувача разом з лічильниками з готових агрегатів"""
+    # Ще не записаний час входу
+    user = dict(user, **activity_updates.pending(USERS_FILE, user['id']))
+
+    apiary_stats = db.aggregate(APIARIES_FILE, 'user_id', user['id'])
+    journal_entries = db.aggregate(JOURNAL_FILE, 'user_id', user['id'])['count']
+
+    return {
+        'id': user['id'],
+        'email': user['email'],
+        'full_name': user['full_name'],
+        'user_type': user['user_type'],
+        'phone': user.get('phone', ''),
+        'is_verified': user.get('is_verified', False),
+        'created_at': user['created_at'],
+        'last_login': user.get('last_login'),
+        'apiaries_count': apiary_stats['count'],
+        'total_hives': apiary_stats['sums']['hive_count'],
+        'journal_entries': journal_entries
+    }
+
+
 @app.route('/api/profile', methods=['GET'])
 @utf8_response
 def get_profile():
@@ -225,42 +437,21 @@ def get_profile():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        users = load_data(USERS_FILE)
-
-        for user in users:
-            if user['id'] == user_id:
-                # Отримуємо статистику для профілю
-                apiaries = load_data(APIARIES_FILE)
-                user_apiaries = [a for a in apiaries if a.get('user_id') == user_id]
-                total_hives = sum(a.get('hive_count', 0) for a in user_apiaries)
+        user = db.get(USERS_FILE, user_id)
 
-                notes = load_data(JOURNAL_FILE)
-                user_notes = [n for n in notes if n.get('user_id') == user_id]
+        if not user:
+            return jsonify({'success': False, 'message': 'Профіль не знайдено'})
 
-                # Створюємо відповідь
-                response_data = {
-                    'success': True,
-                    'profile': {
-                        'id': user['id'],
-                        'email': user['email'],
-                        'full_name': user['full_name'],
-                        'user_type': user['user_type'],
-                        'phone': user.get('phone', ''),
-                        'is_verified': user.get('is_verified', False),
-                        'created_at': user['created_at'],
-                        'last_login': user.get('last_login'),
-                        'apiaries_count': len(user_apiaries),
-                        'total_hives': total_hives,
-                        'journal_entries': len(user_notes)
-                    }
-                }
-
-                # Створюємо JSON відповідь з правильним кодуванням
-                response = jsonify(response_data)
-                response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return response
+        # Створюємо відповідь
+        response_data = {
+            'success': True,
+            'profile': build_profile(user)
+        }
 
-        return jsonify({'success': False, 'message': 'Профіль не знайдено'})
+        # Створюємо JSON відповідь з правильним кодуванням
+        response = jsonify(response_data)
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        return response
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -276,41 +467,41 @@ def update_profile():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        users = load_data(USERS_FILE)
-
-        for i, user in enumerate(users):
-            if user['id'] == user_id:
-                # Оновлюємо дані
-                if 'full_name' in data:
-                    users[i]['full_name'] = data['full_name'].strip()
-                if 'phone' in data:
-                    users[i]['phone'] = data['phone'].strip()
-                if 'user_type' in data:
-                    users[i]['user_type'] = data['user_type']
-
-                # Оновлюємо пароль, якщо надано
-                if 'password' in data and data['password']:
-                    if len(data['password']) >= 6:
-                        users[i]['password'] = hash_password(data['password'])
-                    else:
-                        return jsonify({'success': False, 'message': 'Пароль має бути від 6 символів'})
-
-                users[i]['updated_at'] = datetime.now().isoformat()
-                save_data(USERS_FILE, users)
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Профіль успішно оновлено',
-                    'profile': {
-                        'id': user['id'],
-                        'email': user['email'],
-                        'full_name': users[i]['full_name'],
-                        'phone': users[i].get('phone', ''),
-                        'user_type': users[i]['user_type']
-                    }
-                })
+        user = db.get(USERS_FILE, user_id)
+
+        if not user:
+            return jsonify({'success': False, 'message': 'Користувача не знайдено'})
+
+        # Оновлюємо дані
+        changes = {}
+        if 'full_name' in data:
+            changes['full_name'] = data['full_name'].strip()
+        if 'phone' in data:
+            changes['phone'] = data['phone'].strip()
+        if 'user_type' in data:
+            changes['user_type'] = data['user_type']
+
+        # Оновлюємо пароль, якщо надано
+        if 'password' in data and data['password']:
+            if len(data['password']) >= 6:
+                changes['password'] = hash_password(data['password'])
+            else:
+                return jsonify({'success': False, 'message': 'Пароль має бути від 6 символів'})
 
-        return jsonify({'success': False, 'message': 'Користувача не знайдено'})
+        changes['updated_at'] = datetime.now().isoformat()
+        user = db.update(USERS_FILE, user_id, changes)
+
+        return jsonify({
+            'success': True,
+            'message': 'Профіль успішно оновлено',
+            'profile': {
+                'id': user['id'],
+                'email': user['email'],
+                'full_name': user['full_name'],
+                'phone': user.get('phone', ''),
+                'user_type': user['user_type']
+            }
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -325,16 +516,77 @@ def get_apiaries():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        apiaries = load_data(APIARIES_FILE)
-        user_apiaries = [a for a in apiaries if a.get('user_id') == user_id]
-
-        # Сортуємо за датою створення (нові спочатку)
-        user_apiaries.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        try:
+            limit, cursor = get_page_params()
+            # Нові спочатку; сторінка береться з індексу, впорядкованого за датою
+            user_apiaries, next_cursor = db.find_page(APIARIES_FILE, limit=limit, cursor=cursor,
+                                                      user_id=user_id)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
 
         return jsonify({
             'success': True,
             'apiaries': user_apiaries,
-            'count': len(user_apiaries)
+            'count': len(user_apiaries),
+            'next_cursor': next_cursor
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
+
+
+@app.route('/api/apiaries/nearby', methods=['GET'])
+def get_nearby_apiaries():
+    """Пасіки в радіусі від точки (lat, lon) або від пасіки (apiary_id) з перекриттям зон льоту"""
+    try:
+        apiary_id = request.args.get('apiary_id')
+        try:
+            if apiary_id:
+                center = db.get(APIARIES_FILE, apiary_id)
+                if not center:
+                    return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
+                point = record_point(center)
+                if point is None:
+                    return jsonify({'success': False, 'message': 'Не вказано координати'})
+                lat, lon = point
+            else:
+                lat = float(request.args['lat'])
+                lon = float(request.args['lon'])
+            radius_km = float(request.args.get('radius', 10))
+            limit = min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE)
+        except (KeyError, ValueError):
+            return jsonify({'success': False, 'message': 'Невірні координати, радіус або ліміт'})
+
+        if not 0 < radius_km <= NEARBY_MAX_RADIUS or limit < 1:
+            return jsonify({'success': False,
+                            'message': f'Радіус має бути від 0 до {NEARBY_MAX_RADIUS} км, ліміт - додатний'})
+
+        # Сама пасіка-центр у результат не потрапляє
+        found = db.nearby(APIARIES_FILE, lat, lon, radius_km, limit + 1 if apiary_id else limit)
+        found = [(distance, a) for distance, a in found if a['id'] != apiary_id][:limit]
+
+        nearby = []
+        for distance, apiary in found:
+            overlap = circle_overlap_fraction(distance, FORAGE_RADIUS_KM)
+            nearby.append({
+                'id': apiary['id'],
+                'user_id': apiary.get('user_id'),
+                'name': apiary.get('name'),
+                'latitude': apiary.get('latitude'),
+                'longitude': apiary.get('longitude'),
+                'hive_count': apiary.get('hive_count', 0),
+                'distance_km': round(distance, 3),
+                'forage_overlap': overlap > 0,
+                'overlap_percent': round(overlap * 100, 1)
+            })
+
+        return jsonify({
+            'success': True,
+            'center': {'lat': lat, 'lon': lon},
+            'radius_km': radius_km,
+            'forage_radius_km': FORAGE_RADIUS_KM,
+            'apiaries': nearby,
+            'count': len(nearby)
         })
 
     except Exception as e:
@@ -349,23 +601,21 @@ def get_apiary(apiary_id):
         if not apiary_id or not user_id:
             return jsonify({'success': False, 'message': 'ID пасіки або користувача не вказано'})
 
-        apiaries = load_data(APIARIES_FILE)
+        apiary = db.find_one(APIARIES_FILE, id=apiary_id, user_id=user_id)
 
-        for apiary in apiaries:
-            if apiary['id'] == apiary_id and apiary['user_id'] == user_id:
-                # Отримуємо нотатки для цієї пасіки
-                notes = load_data(JOURNAL_FILE)
-                apiary_notes = [n for n in notes if n.get('apiary_id') == apiary_id]
+        if not apiary:
+            return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
 
-                apiary['notes_count'] = len(apiary_notes)
-                apiary['last_note'] = apiary_notes[0] if apiary_notes else None
+        # Отримуємо нотатки для цієї пасіки
+        apiary_notes = db.find(JOURNAL_FILE, apiary_id=apiary_id)
 
-                return jsonify({
-                    'success': True,
-                    'apiary': apiary
-                })
+        apiary['notes_count'] = len(apiary_notes)
+        apiary['last_note'] = apiary_notes[0] if apiary_notes else None
 
-        return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
+        return jsonify({
+            'success': True,
+            'apiary': apiary
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -381,18 +631,13 @@ def add_apiary():
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
         # Перевіряємо користувача
-        users = load_data(USERS_FILE)
-        user_exists = False
-        for i, user in enumerate(users):
-            if user['id'] == user_id:
-                users[i]['apiaries_count'] = users[i].get('apiaries_count', 0) + 1
-                save_data(USERS_FILE, users)
-                user_exists = True
-                break
-
-        if not user_exists:
+        user = db.get(USERS_FILE, user_id)
+
+        if not user:
             return jsonify({'success': False, 'message': 'Користувача не знайдено'})
 
+        db.update(USERS_FILE, user_id, lambda u: {'apiaries_count': u.get('apiaries_count', 0) + 1})
+
         new_apiary = {
             'id': str(uuid.uuid4()),
             'user_id': user_id,
@@ -407,9 +652,7 @@ def add_apiary():
             'updated_at': datetime.now().isoformat()
         }
 
-        apiaries = load_data(APIARIES_FILE)
-        apiaries.append(new_apiary)
-        save_data(APIARIES_FILE, apiaries)
+        db.insert(APIARIES_FILE, new_apiary)
 
         return jsonify({
             'success': True,
@@ -431,31 +674,32 @@ def update_apiary():
         if not apiary_id or not user_id:
             return jsonify({'success': False, 'message': 'ID пасіки або користувача не вказано'})
 
-        apiaries = load_data(APIARIES_FILE)
-
         # Шукаємо пасіку
-        for i, apiary in enumerate(apiaries):
-            if apiary['id'] == apiary_id and apiary['user_id'] == user_id:
-                # Оновлюємо поля
-                apiaries[i]['name'] = data.get('name', apiary['name'])
-                apiaries[i]['location'] = data.get('location', apiary['location'])
-                apiaries[i]['latitude'] = data.get('latitude', apiary.get('latitude', 50.45))
-                apiaries[i]['longitude'] = data.get('longitude', apiary.get('longitude', 30.52))
-                apiaries[i]['hive_count'] = int(data.get('hive_count', apiary.get('hive_count', 0)))
-                apiaries[i]['hive_type'] = data.get('hive_type', apiary.get('hive_type', 'Дадан'))
-                apiaries[i]['description'] = data.get('description', apiary.get('description', ''))
-                apiaries[i]['updated_at'] = datetime.now().isoformat()
-
-                # Зберігаємо
-                save_data(APIARIES_FILE, apiaries)
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Пасіку оновлено успішно',
-                    'apiary': apiaries[i]
-                })
+        apiary = db.find_one(APIARIES_FILE, id=apiary_id, user_id=user_id)
 
-        return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
+        if not apiary:
+            return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
+
+        # Оновлюємо поля
+        changes = {
+            'name': data.get('name', apiary['name']),
+            'location': data.get('location', apiary['location']),
+            'latitude': data.get('latitude', apiary.get('latitude', 50.45)),
+            'longitude': data.get('longitude', apiary.get('longitude', 30.52)),
+            'hive_count': int(data.get('hive_count', apiary.get('hive_count', 0))),
+            'hive_type': data.get('hive_type', apiary.get('hive_type', 'Дадан')),
+            'description': data.get('description', apiary.get('description', '')),
+            'updated_at': datetime.now().isoformat()
+        }
+
+        # Зберігаємо
+        apiary = db.update(APIARIES_FILE, apiary_id, changes)
+
+        return jsonify({
+            'success': True,
+            'message': 'Пасіку оновлено успішно',
+            'apiary': apiary
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -471,37 +715,24 @@ def delete_apiary():
         if not apiary_id or not user_id:
             return jsonify({'success': False, 'message': 'ID пасіки або користувача не вказано'})
 
-        apiaries = load_data(APIARIES_FILE)
-
         # Шукаємо пасіку
-        for i, apiary in enumerate(apiaries):
-            if apiary['id'] == apiary_id and apiary['user_id'] == user_id:
-                # Видаляємо пасіку
-                deleted_apiary = apiaries.pop(i)
-
-                # Оновлюємо кількість пасік у користувача
-                users = load_data(USERS_FILE)
-                for j, user in enumerate(users):
-                    if user['id'] == user_id:
-                        users[j]['apiaries_count'] = max(0, users[j].get('apiaries_count', 0) - 1)
-                        save_data(USERS_FILE, users)
-                        break
-
-                # Видаляємо нотатки цієї пасіки
-                notes = load_data(JOURNAL_FILE)
-                notes = [n for n in notes if n.get('apiary_id') != apiary_id]
-                save_data(JOURNAL_FILE, notes)
-
-                # Зберігаємо оновлений список пасік
-                save_data(APIARIES_FILE, apiaries)
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Пасіку видалено успішно',
-                    'deleted_apiary': deleted_apiary
-                })
+        if not db.find_one(APIARIES_FILE, id=apiary_id, user_id=user_id):
+            return jsonify({'success': False, 'message': 'Пасіку не знайдено або у вас немає прав'})
 
-        return jsonify({'success': False, 'message': 'Пасіку не знайдено або у вас немає прав'})
+        # Видаляємо пасіку
+        deleted_apiary = db.delete(APIARIES_FILE, apiary_id)
+
+        # Оновлюємо кількість пасік у користувача
+        db.update(USERS_FILE, user_id, lambda u: {'apiaries_count': max(0, u.get('apiaries_count', 0) - 1)})
+
+        # Видаляємо нотатки цієї пасіки
+        db.delete_where(JOURNAL_FILE, apiary_id=apiary_id)
+
+        return jsonify({
+            'success': True,
+            'message': 'Пасіку видалено успішно',
+            'deleted_apiary': deleted_apiary
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -517,19 +748,22 @@ def get_journal_notes():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        notes = load_data(JOURNAL_FILE)
-
+        filters = {'user_id': user_id}
         if apiary_id:
-            user_notes = [n for n in notes if n.get('user_id') == user_id and n.get('apiary_id') == apiary_id]
-        else:
-            user_notes = [n for n in notes if n.get('user_id') == user_id]
+            filters['apiary_id'] = apiary_id
 
-        user_notes.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        try:
+            limit, cursor = get_page_params()
+            # Нові спочатку; сторінка береться з індексу, впорядкованого за датою
+            user_notes, next_cursor = db.find_page(JOURNAL_FILE, limit=limit, cursor=cursor, **filters)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
 
         return jsonify({
             'success': True,
             'notes': user_notes,
-            'count': len(user_notes)
+            'count': len(user_notes),
+            'next_cursor': next_cursor
         })
 
     except Exception as e:
@@ -544,23 +778,21 @@ def get_journal_note(note_id):
         if not note_id or not user_id:
             return jsonify({'success': False, 'message': 'ID нотатки або користувача не вказано'})
 
-        notes = load_data(JOURNAL_FILE)
+        note = db.find_one(JOURNAL_FILE, id=note_id, user_id=user_id)
 
-        for note in notes:
-            if note['id'] == note_id and note['user_id'] == user_id:
-                # Додаємо інформацію про пасіку, якщо є apiary_id
-                if note.get('apiary_id'):
-                    apiaries = load_data(APIARIES_FILE)
-                    apiary_info = next((a for a in apiaries if a['id'] == note['apiary_id']), None)
-                    if apiary_info:
-                        note['apiary_name'] = apiary_info.get('name', 'Невідома пасіка')
+        if not note:
+            return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
 
-                return jsonify({
-                    'success': True,
-                    'note': note
-                })
+        # Додаємо інформацію про пасіку, якщо є apiary_id
+        if note.get('apiary_id'):
+            apiary_info = db.get(APIARIES_FILE, note['apiary_id'])
+            if apiary_info:
+                note['apiary_name'] = apiary_info.get('name', 'Невідома пасіка')
 
-        return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
+        return jsonify({
+            'success': True,
+            'note': note
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -589,9 +821,7 @@ def add_journal_note():
             'updated_at': datetime.now().isoformat()
         }
 
-        notes = load_data(JOURNAL_FILE)
-        notes.append(new_note)
-        save_data(JOURNAL_FILE, notes)
+        db.insert(JOURNAL_FILE, new_note)
 
         return jsonify({
             'success': True,
@@ -613,30 +843,31 @@ def update_journal_note():
         if not note_id or not user_id:
             return jsonify({'success': False, 'message': 'ID нотатки або користувача не вказано'})
 
-        notes = load_data(JOURNAL_FILE)
-
         # Шукаємо нотатку
-        for i, note in enumerate(notes):
-            if note['id'] == note_id and note['user_id'] == user_id:
-                # Оновлюємо поля
-                notes[i]['title'] = data.get('title', note['title'])
-                notes[i]['content'] = data.get('content', note['content'])
-                notes[i]['work_type'] = data.get('work_type', note.get('work_type', 'інше'))
-                notes[i]['hives_affected'] = int(data.get('hives_affected', note.get('hives_affected', 0)))
-                notes[i]['temperature'] = data.get('temperature', note.get('temperature'))
-                notes[i]['weather'] = data.get('weather', note.get('weather'))
-                notes[i]['apiary_id'] = data.get('apiary_id', note.get('apiary_id'))
-                notes[i]['updated_at'] = datetime.now().isoformat()
-
-                save_data(JOURNAL_FILE, notes)
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Нотатку оновлено успішно',
-                    'note': notes[i]
-                })
+        note = db.find_one(JOURNAL_FILE, id=note_id, user_id=user_id)
+
+        if not note:
+            return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
+
+        # Оновлюємо поля
+        changes = {
+            'title': data.get('title', note['title']),
+            'content': data.get('content', note['content']),
+            'work_type': data.get('work_type', note.get('work_type', 'інше')),
+            'hives_affected': int(data.get('hives_affected', note.get('hives_affected', 0))),
+            'temperature': data.get('temperature', note.get('temperature')),
+            'weather': data.get('weather', note.get('weather')),
+            'apiary_id': data.get('apiary_id', note.get('apiary_id')),
+            'updated_at': datetime.now().isoformat()
+        }
 
-        return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
+        note = db.update(JOURNAL_FILE, note_id, changes)
+
+        return jsonify({
+            'success': True,
+            'message': 'Нотатку оновлено успішно',
+            'note': note
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -652,83 +883,61 @@ def delete_journal_note():
         if not note_id or not user_id:
             return jsonify({'success': False, 'message': 'ID нотатки або користувача не вказано'})
 
-        notes = load_data(JOURNAL_FILE)
-
         # Шукаємо нотатку
-        for i, note in enumerate(notes):
-            if note['id'] == note_id and note['user_id'] == user_id:
-                deleted_note = notes.pop(i)
-                save_data(JOURNAL_FILE, notes)
+        if not db.find_one(JOURNAL_FILE, id=note_id, user_id=user_id):
+            return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
 
-                return jsonify({
-                    'success': True,
-                    'message': 'Нотатку видалено успішно',
-                    'deleted_note': deleted_note
-                })
+        deleted_note = db.delete(JOURNAL_FILE, note_id)
 
-        return jsonify({'success': False, 'message': 'Нотатку не знайдено'})
+        return jsonify({
+            'success': True,
+            'message': 'Нотатку видалено успішно',
+            'deleted_note': deleted_note
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
 # ==================== СПІВПРАЦЯ ПАСІЧНИК-ФЕРМЕР ====================
+# Скринька заявок: вхідні адресовані користувачу, вихідні - надіслані ним
+COOPERATION_BOXES = {'inbox': 'to_user_id', 'outbox': 'from_user_id'}
+
+
 @app.route('/api/cooperation/requests', methods=['GET'])
 def get_cooperation_requests():
-    """Отримання заявок на співпрацю"""
+    """Заявки на співпрацю: вхідні (box=inbox) або вихідні (box=outbox), від нових до старих.
+
+    Необов'язкові фільтри status і type; пагінація через limit та cursor.
+    """
     try:
         user_id = request.args.get('user_id')
 
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        # Завантажуємо збережені запити
-        requests_data = load_data(COOPERATION_FILE)
-        user_requests = [r for r in requests_data if r.get('to_user_id') == user_id]
+        box = request.args.get('box', 'inbox')
+        if box not in COOPERATION_BOXES:
+            return jsonify({'success': False, 'message': 'Невірна скринька (inbox або outbox)'})
 
-        # Якщо немає збережених, створюємо демо-дані
-        if not user_requests:
-            user_requests = [
-                {
-                    'id': 'req1',
-                    'from_user': 'Фермер Петренко',
-                    'from_user_id': 'farmer1',
-                    'to_user_id': user_id,
-                    'type': 'pollination',
-                    'message': 'Потрібні бджоли для запилення яблуневого саду',
-                    'location': 'с. Зелене, Київська обл.',
-                    'area_ha': 5,
-                    'crop': 'Яблуня',
-                    'bloom_period': '15.04 - 05.05',
-                    'status': 'pending',
-                    'created_at': '2024-04-01T10:00:00'
-                },
-                {
-                    'id': 'req2',
-                    'from_user': 'Фермер Коваленко',
-                    'from_user_id': 'farmer2',
-                    'to_user_id': user_id,
-                    'type': 'placement',
-                    'message': 'Пропоную місце для пасіки на моїх полях',
-                    'location': 'м. Вінниця',
-                    'area_ha': 3,
-                    'price_per_month': 0,
-                    'status': 'pending',
-                    'created_at': '2024-04-02T14:30:00'
-                }
-            ]
-            # Зберігаємо демо-дані
-            for req in user_requests:
-                requests_data.append(req)
-            save_data(COOPERATION_FILE, requests_data)
+        filters = {COOPERATION_BOXES[box]: user_id}
+        for field in ('status', 'type'):
+            if request.args.get(field):
+                filters[field] = request.args[field]
 
-        # Сортуємо за датою (нові спочатку)
-        user_requests.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        try:
+            limit, cursor = get_page_params()
+            # Сторінка береться з індексу за отримувачем/відправником, впорядкованого за датою
+            user_requests, next_cursor = db.find_page(COOPERATION_FILE, limit=limit, cursor=cursor, **filters)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
 
         return jsonify({
             'success': True,
+            'box': box,
             'requests': user_requests,
-            'count': len(user_requests)
+            'count': len(user_requests),
+            'next_cursor': next_cursor
         })
 
     except Exception as e:
@@ -762,12 +971,9 @@ def send_cooperation_request():
             'created_at': datetime.now().isoformat()
         }
 
-        # Завантажуємо існуючі запити
-        requests_data = load_data(COOPERATION_FILE)
-        requests_data.append(new_request)
-
-        # Зберігаємо оновлений список
-        save_data(COOPERATION_FILE, requests_data)
+        # Зберігаємо запит
+        db.insert(COOPERATION_FILE, new_request)
+        event_hub.publish(new_request['to_user_id'])
 
         return jsonify({
             'success': True,
@@ -792,31 +998,121 @@ def respond_to_cooperation_request():
         if not request_id or not response:
             return jsonify({'success': False, 'message': 'Не вказано ID запиту або відповідь'})
 
-        requests_data = load_data(COOPERATION_FILE)
+        # Шукаємо запит та зберігаємо відповідь
+        updated_request = db.update(COOPERATION_FILE, request_id, {
+            'status': 'accepted' if response == 'accept' else 'rejected',
+            'response_message': message,
+            'responded_at': datetime.now().isoformat()
+        })
 
-        # Шукаємо запит
-        for i, req in enumerate(requests_data):
-            if req['id'] == request_id:
-                requests_data[i]['status'] = 'accepted' if response == 'accept' else 'rejected'
-                requests_data[i]['response_message'] = message
-                requests_data[i]['responded_at'] = datetime.now().isoformat()
+        if not updated_request:
+            return jsonify({'success': False, 'message': 'Заявку не знайдено'})
+        event_hub.publish(updated_request.get('from_user_id'))
 
-                # Зберігаємо оновлені дані
-                save_data(COOPERATION_FILE, requests_data)
+        return jsonify({
+            'success': True,
+            'message': f'Заявку успішно {"прийнято" if response == "accept" else "відхилено"}',
+            'request': updated_request
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
-                return jsonify({
-                    'success': True,
-                    'message': f'Заявку успішно {"прийнято" if response == "accept" else "відхилено"}',
-                    'request': requests_data[i]
-                })
 
-        return jsonify({'success': False, 'message': 'Заявку не знайдено'})
+def crop_bloom_window(crop):
+    """Період цвітіння культури з каталогу медоносів (за назвою) або None"""
+    crop = (crop or '').strip().lower()
+    if not crop:
+        return None
+    for plant in data_store.get(HONEY_PLANTS_FILE):
+        if not isinstance(plant, dict) or not (plant.get('name') or '').lower().startswith(crop):
+            continue
+        # Записи каталогу без дат цвітіння пропускаємо
+        if plant.get('bloom_start') and plant.get('bloom_end'):
+            return parse_day_month(plant['bloom_start']), parse_day_month(plant['bloom_end'])
+    return None
+
+
+@app.route('/api/cooperation/match', methods=['POST'])
+def match_beekeepers():
+    """Рейтинг пасічників для запилення культури (crop) у період bloom_period біля точки (lat, lon).
+
+    Кандидати беруться з просторового індексу пасік, а прийняті заявки на запилення,
+    що перетинаються з періодом цвітіння, зменшують кількість вільних вуликів.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            lat = float(data['lat'])
+            lon = float(data['lon'])
+            radius_km = float(data.get('radius', MATCH_RADIUS_KM))
+            limit = min(int(data.get('limit', 20)), MAX_PAGE_SIZE)
+            area_ha = float(data.get('area_ha') or 0)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Невірні координати, радіус, площа або ліміт'})
+
+        if not 0 < radius_km <= NEARBY_MAX_RADIUS or limit < 1 or area_ha < 0:
+            return jsonify({'success': False,
+                            'message': f'Радіус має бути від 0 до {NEARBY_MAX_RADIUS} км, ліміт - додатний'})
+
+        try:
+            window = parse_bloom_period(data['bloom_period']) if data.get('bloom_period') \
+                else crop_bloom_window(data.get('crop'))
+        except (AttributeError, ValueError):
+            return jsonify({'success': False, 'message': 'Невірний період цвітіння (DD.MM - DD.MM)'})
+        if window is None:
+            return jsonify({'success': False, 'message': 'Не вказано період цвітіння'})
+
+        hives_needed = hives_for_area(area_ha, POLLINATION_HIVES_PER_HA)
+        nearby = db.nearby(APIARIES_FILE, lat, lon, radius_km)
+        # Зайнятість перевіряємо лише для пасічників поблизу - через індекс to_user_id
+        candidate_ids = {apiary.get('user_id') for _, apiary in nearby} - {None, data.get('from_user_id')}
+        commitments = [c for user_id in candidate_ids
+                       for c in db.find(COOPERATION_FILE, to_user_id=user_id, type='pollination', status='accepted')]
+        ranked = rank_beekeepers(nearby, commitments, window, radius_km, hives_needed,
+                                 POLLINATION_HIVES_PER_HA, exclude_user_id=data.get('from_user_id'))
+
+        matches = ranked[:limit]
+        for match in matches:
+            user = db.get(USERS_FILE, match['user_id']) or {}
+            match['full_name'] = user.get('full_name')
+
+        return jsonify({
+            'success': True,
+            'crop': data.get('crop', ''),
+            'bloom_period': window_label(window),
+            'center': {'lat': lat, 'lon': lon},
+            'radius_km': radius_km,
+            'hives_needed': hives_needed,
+            'matches': matches,
+            'count': len(matches),
+            'total_candidates': len(ranked)
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
 # ==================== СПОВІЩЕННЯ ====================
+def notification_counts(user_id):
+    """(непрочитані, усього) сповіщень користувача з агрегату, без перебору самих сповіщень"""
+    summary = db.aggregate(NOTIFICATIONS_FILE, 'user_id', user_id)
+    return summary['count'] - summary['histograms']['is_read'].get(True, 0), summary['count']
+
+
+def summarize_notifications(user_id, limit=None, cursor=None):
+    """Сторінка сповіщень від нових до старих разом з кількістю непрочитаних"""
+    user_notifications, next_cursor = db.find_page(NOTIFICATIONS_FILE, limit=limit, cursor=cursor,
+                                                   user_id=user_id)
+    unread_count, total = notification_counts(user_id)
+    return {
+        'notifications': user_notifications,
+        'unread_count': unread_count,
+        'total': total,
+        'next_cursor': next_cursor
+    }
+
+
 @app.route('/api/notifications', methods=['GET'])
 def get_notifications():
     """Отримання сповіщення для користувача"""
@@ -826,58 +1122,13 @@ def get_notifications():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        # Завантажуємо сповіщення з файлу
-        notifications_data = load_data(NOTIFICATIONS_FILE)
-        user_notifications = [n for n in notifications_data if n.get('user_id') == user_id]
-
-        # Якщо немає сповіщень, створюємо демо-дані
-        if not user_notifications:
-            user_notifications = [
-                {
-                    'id': 'notif1',
-                    'user_id': user_id,
-                    'type': 'info',
-                    'title': 'Початок цвітіння ріпаку',
-                    'message': 'Ріпак почне цвісти через 3 дні в вашому регіоні',
-                    'is_read': False,
-                    'created_at': datetime.now().isoformat()
-                },
-                {
-                    'id': 'notif2',
-                    'user_id': user_id,
-                    'type': 'warning',
-                    'title': 'Прогноз погоди',
-                    'message': 'Завтра очікується дощ, обмежте роботи з бджолами',
-                    'is_read': True,
-                    'created_at': (datetime.now() - timedelta(days=1)).isoformat()
-                },
-                {
-                    'id': 'notif3',
-                    'user_id': user_id,
-                    'type': 'success',
-                    'title': 'Нова заявка',
-                    'message': 'Фермер Петренко запрошує вас для співпраці',
-                    'is_read': False,
-                    'created_at': datetime.now().isoformat()
-                }
-            ]
-            # Зберігаємо демо-дані
-            for notif in user_notifications:
-                notifications_data.append(notif)
-            save_data(NOTIFICATIONS_FILE, notifications_data)
-
-        # Сортуємо за датою (нові спочатку)
-        user_notifications.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        try:
+            limit, cursor = get_page_params()
+            summary = summarize_notifications(user_id, limit, cursor)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
 
-        # Рахуємо непрочитані
-        unread_count = sum(1 for n in user_notifications if not n.get('is_read', False))
-
-        return jsonify({
-            'success': True,
-            'notifications': user_notifications,
-            'unread_count': unread_count,
-            'total': len(user_notifications)
-        })
+        return jsonify(dict(summary, success=True))
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -894,23 +1145,23 @@ def mark_notification_read():
         if not notification_id or not user_id:
             return jsonify({'success': False, 'message': 'Не вказано ID сповіщення або користувача'})
 
-        notifications_data = load_data(NOTIFICATIONS_FILE)
-
         # Шукаємо сповіщення
-        for i, notif in enumerate(notifications_data):
-            if notif['id'] == notification_id and notif['user_id'] == user_id:
-                notifications_data[i]['is_read'] = True
-                notifications_data[i]['read_at'] = datetime.now().isoformat()
-
-                # Зберігаємо оновлені дані
-                save_data(NOTIFICATIONS_FILE, notifications_data)
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Сповіщення позначено як прочитане'
-                })
+        notification = db.find_one(NOTIFICATIONS_FILE, id=notification_id, user_id=user_id)
+        if not notification:
+            return jsonify({'success': False, 'message': 'Сповіщення не знайдено'})
+
+        # Зберігаємо оновлені дані (вже прочитане не переписуємо)
+        if not notification.get('is_read', False):
+            db.update(NOTIFICATIONS_FILE, notification_id, {
+                'is_read': True,
+                'read_at': datetime.now().isoformat()
+            })
 
-        return jsonify({'success': False, 'message': 'Сповіщення не знайдено'})
+        return jsonify({
+            'success': True,
+            'message': 'Сповіщення позначено як прочитане',
+            'unread_count': notification_counts(user_id)[0]
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
@@ -926,26 +1177,235 @@ def mark_all_notifications_read():
         if not user_id:
             return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
-        notifications_data = load_data(NOTIFICATIONS_FILE)
-
         # Позначаємо всі сповіщення користувача як прочитані
-        for i, notif in enumerate(notifications_data):
-            if notif['user_id'] == user_id and not notif.get('is_read', False):
-                notifications_data[i]['is_read'] = True
-                notifications_data[i]['read_at'] = datetime.now().isoformat()
+        unread_ids = [n['id'] for n in db.find(NOTIFICATIONS_FILE, user_id=user_id)
+                      if not n.get('is_read', False)]
 
         # Зберігаємо оновлені дані
-        save_data(NOTIFICATIONS_FILE, notifications_data)
+        db.update_many(NOTIFICATIONS_FILE, unread_ids, {
+            'is_read': True,
+            'read_at': datetime.now().isoformat()
+        })
 
         return jsonify({
             'success': True,
-            'message': 'Усі сповіщення позначено як прочитані'
+            'message': 'Усі сповіщення позначено як прочитані',
+            'unread_count': notification_counts(user_id)[0]
         })
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
+@app.route('/api/notifications/unread-count', methods=['GET'])
+def get_unread_notifications_count():
+    """Кількість непрочитаних сповіщень для значка в застосунку"""
+    try:
+        user_id = request.args.get('user_id')
+
+        if not user_id:
+            return jsonify({'success': False, 'message': 'Користувач не вказаний'})
+
+        unread_count, total = notification_counts(user_id)
+        return jsonify({'success': True, 'unread_count': unread_count, 'total': total})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
+
+
+# ==================== ПАКЕТНІ СПОВІЩЕННЯ ====================
+def generate_notifications():
+    """Оцінює всі пасіки за календарем цвітіння та кешованими прогнозами і додає нові сповіщення.
+
+    Прогнози беруться лише з кешу погоди (його для пасік підтримує фоновий
+    оновлювач), угіддя - з аналізатора за клітинкою сітки аналізу. Id сповіщень
+    стабільні, тож повторний запуск (чи запуск в іншому воркері) не дублює їх.
+    """
+    global forecast_days_cache
+    started = time.time()
+    now = datetime.now()
+    weather_refresher.start()
+
+    apiaries = db.all(APIARIES_FILE)
+    upcoming = get_bloom_index().upcoming_starts(now.date(), ALERT_BLOOM_DAYS)
+    analyzer, _ = get_forage_analyzer()
+
+    points, cells = {}, {}
+    for apiary in apiaries:
+        point = record_point(apiary)
+        if point is not None:
+            points[apiary.get('id')] = point
+            cells[apiary.get('id')] = weather_cell(point[0], point[1], WEATHER_GRID_DEGREES)
+
+    # Дні прогнозу перераховуються лише для клітинок, відповідь API яких оновилася з минулого запуску
+    today = now.date()
+    previous, forecast_days_cache, forecasts = forecast_days_cache, {}, {}
+    for cell in set(cells.values()):
+        stored_at = weather_cache.stored_at(('forecast', cell))
+        if stored_at is None or time.time() - stored_at > WEATHER_STALE_TTL:
+            continue
+        known = previous.get(cell)
+        if known is None or known[0] != stored_at or known[1] != today:
+            cached = weather_cache.peek(('forecast', cell), WEATHER_STALE_TTL)
+            if cached is None:
+                continue
+            known = (stored_at, today, daily_forecast(cached))
+        forecast_days_cache[cell] = known
+        forecasts[cell] = known[2]
+
+    # Медоноси в радіусі льоту рахуються один раз на клітинку сітки аналізу
+    forage_by_cell = {}
+
+    def forage_plants(apiary):
+        point = points.get(apiary.get('id'))
+        if point is None:
+            return None
+        cell = weather_cell(point[0], point[1], ANALYSIS_GRID_DEGREES)
+        if cell not in forage_by_cell:
+            positions, _ = analyzer.within(cell[0], cell[1], FORAGE_RADIUS_KM)
+            forage_by_cell[cell] = {analyzer.plant_ids[p] for p in positions} or None
+        return forage_by_cell[cell]
+
+    notifications = build_notifications(apiaries, upcoming, forecasts, lambda apiary: cells.get(apiary.get('id')),
+                                        forage_plants, now)
+    # Час створення ставимо безпосередньо перед записом: оцінка триває секунди, а потоки
+    # подій шукають нові записи лише в межах STREAM_GRACE_SECONDS за своїм курсором
+    created_at = datetime.now().isoformat()
+    for notification in notifications:
+        notification['created_at'] = created_at
+    inserted = db.insert_missing(NOTIFICATIONS_FILE, notifications)
+    for user_id in {n['user_id'] for n in inserted}:
+        event_hub.publish(user_id)
+
+    return {
+        'apiaries': len(apiaries),
+        'weather_cells': len(forecasts),
+        'upcoming_plants': len(upcoming),
+        'generated': len(notifications),
+        'inserted': len(inserted),
+        'seconds': round(time.time() - started, 3)
+    }
+
+
+@app.route('/api/notifications/generate', methods=['POST'])
+def run_notification_job():
+    """Позачерговий запуск пакетного формування сповіщень (наприклад, з cron)"""
+    try:
+        return jsonify({'success': True, 'result': notification_job.run_once()})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
+
+
+@app.before_request
+def start_background_jobs():
+    notification_job.start()
+
+
+# ==================== ПОТІК ПОДІЙ ====================
+def records_newer_than(filename, since, **filters):
+    """Записи, новіші за ключ since (created_at, id), від старих до нових - сторінками з індексу"""
+    found, cursor = [], None
+    while True:
+        page, cursor = db.find_page(filename, limit=MAX_PAGE_SIZE, cursor=cursor, **filters)
+        fresh = [r for r in page if time_key(r) > since]
+        found.extend(fresh)
+        if len(fresh) < len(page) or cursor is None:
+            return found[::-1]
+
+
+def collect_user_events(user_id, since):
+    """Події користувача після ключа since: [(ключ, тип події, запис)] від старих до нових.
+
+    Події виводяться з самих даних (нові сповіщення, вхідні заявки, відповіді
+    на надіслані заявки), тож відновлення з Last-Event-ID працює і після
+    перезапуску, і для змін, записаних іншими воркерами.
+    """
+    events = [(time_key(n), 'notification', n)
+              for n in records_newer_than(NOTIFICATIONS_FILE, since, user_id=user_id)]
+    events += [(time_key(r), 'cooperation_request', r)
+               for r in records_newer_than(COOPERATION_FILE, since, to_user_id=user_id)]
+    for sent in db.find(COOPERATION_FILE, from_user_id=user_id):
+        key = (sent.get('responded_at') or '', str(sent.get('id') or ''))
+        if sent.get('responded_at') and key > since:
+            events.append((key, 'cooperation_status', sent))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def stream_window(since):
+    """Нижня межа повторного перегляду: ключ на STREAM_GRACE_SECONDS раніше за since"""
+    try:
+        start = datetime.fromisoformat(since[0]) - timedelta(seconds=STREAM_GRACE_SECONDS)
+    except ValueError:
+        return since
+    return start.isoformat(), ''
+
+
+@app.route('/api/events/stream', methods=['GET'])
+def stream_events():
+    """Server-Sent Events: нові сповіщення та зміни заявок на співпрацю користувача.
+
+    Клієнт відновлює потік із заголовком Last-Event-ID (або параметром last_event_id);
+    без нього надсилаються лише події після підключення. Записи, що стали видимими
+    із запізненням, потік знаходить, переглядаючи STREAM_GRACE_SECONDS за курсором,
+    а повтори відсіює за id. Після перепідключення події з ключем до Last-Event-ID
+    включно вважаються отриманими.
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Користувач не вказаний'})
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        since = decode_cursor(last_event_id) if last_event_id else (datetime.now().isoformat(), '')
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Невірний Last-Event-ID'})
+
+    if not event_hub.open_stream():
+        # Усі місця для потоків цього воркера зайняті - клієнт повторить спробу пізніше
+        return Response(f'retry: {STREAM_RETRY_MS}\n\n', status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(max(1, STREAM_RETRY_MS // 1000))})
+
+    # Надіслані події вікна: (подія, id, ключ) -> ключ. Новий потік не надсилає вже видимих
+    # подій, а відновлений - подій до Last-Event-ID включно (їх отримало попереднє з'єднання)
+    try:
+        seen = {(event, record.get('id'), key): key
+                for key, event, record in collect_user_events(user_id, stream_window(since))
+                if not last_event_id or key <= since}
+    except Exception:
+        event_hub.close_stream()
+        raise
+
+    def generate(since):
+        deadline = time.time() + STREAM_MAX_SECONDS
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        while time.time() < deadline:
+            # Версію беремо до читання даних, щоб не пропустити зміну між читанням і очікуванням
+            version = event_hub.version(user_id)
+            for key, event, record in collect_user_events(user_id, stream_window(since)):
+                marker = (event, record.get('id'), key)
+                if marker in seen:
+                    continue
+                seen[marker] = key
+                # id події - найдальший відданий ключ, щоб курсор не відступав назад
+                since = max(since, key)
+                yield format_sse(encode_cursor(since), event, record)
+            window = stream_window(since)
+            for marker in [m for m, key in seen.items() if key < window]:
+                del seen[marker]
+            # Без пробудження за STREAM_HEARTBEAT с надсилаємо коментар і перевіряємо дані
+            # (зміни з інших воркерів видно саме так)
+            if not event_hub.wait(user_id, version, min(STREAM_HEARTBEAT, max(0, deadline - time.time()))):
+                yield ': ping\n\n'
+
+    response = Response(generate(since), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Місце звільняється, коли сервер закриває відповідь (зокрема, якщо клієнт відключився)
+    response.call_on_close(event_hub.close_stream)
+    return response
+
+
 # ==================== МЕДОНОСИ ====================
 @app.route('/api/honey-plants', methods=['GET'])
 def get_honey_plants():
@@ -1017,63 +1477,134 @@ def get_honey_plants():
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
+def get_bloom_index():
+    """Індекс цвітіння за каталогом медоносів; перебудовується лише після зміни файлу"""
+    global bloom_index_cache
+    plants = data_store.get(HONEY_PLANTS_FILE)
+    if bloom_index_cache is None or bloom_index_cache[0] is not plants:
+        bloom_index_cache = (plants, BloomIndex(copy_records(plants)))
+    return bloom_index_cache[1]
+
+
+def parse_bloom_date(value):
+    """День року з дати 'YYYY-MM-DD' або 'DD.MM'; ValueError, якщо формат невірний"""
+    try:
+        return date_day_of_year(datetime.strptime(value.strip(), '%Y-%m-%d'))
+    except ValueError:
+        return parse_day_month(value)
+
+
+def parse_calendar_date(value):
+    """Календарна дата з 'YYYY-MM-DD' або 'DD.MM' (поточного року); ValueError, якщо формат невірний"""
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        day, month = value.strip().split('.')[:2]
+        return date_in_year(datetime.now().year, int(day), int(month))
+
+
 @app.route('/api/bloom-calendar', methods=['GET'])
 def bloom_calendar():
+    """Що цвіте: у місяць (month), у день (date) або у вікні дат (from, to).
+
+    upcoming=N додає рослини, що почнуть цвісти протягом N днів після date (або сьогодні).
+    Дати - у форматі YYYY-MM-DD або DD.MM; вікно може переходити через Новий рік.
+    """
     try:
-        month = int(request.args.get('month', datetime.now().month))
+        index = get_bloom_index()
+        response_data = {'success': True}
+
+        try:
+            if request.args.get('from') or request.args.get('to'):
+                start = parse_bloom_date(request.args.get('from') or request.args.get('to'))
+                end = parse_bloom_date(request.args.get('to') or request.args.get('from'))
+                blooming_plants = index.blooming_between(start, end)
+                response_data['period'] = {'from': format_day_of_year(start), 'to': format_day_of_year(end)}
+            elif request.args.get('date'):
+                start = parse_bloom_date(request.args['date'])
+                blooming_plants = index.blooming_on(start)
+                response_data['date'] = format_day_of_year(start)
+            else:
+                month = int(request.args.get('month', datetime.now().month))
+                if not 1 <= month <= 12:
+                    raise ValueError('month')
+                start = day_of_year(1, month)
+                end = day_of_year(1, month + 1) - 1 if month < 12 else DAYS_IN_YEAR
+                blooming_plants = index.blooming_between(start, end)
+                response_data.update({'month': month, 'month_name': get_month_name(month)})
 
-        plants = load_data(HONEY_PLANTS_FILE)
-        if not plants:
-            return jsonify({'success': True, 'month': month, 'blooming_plants': [], 'count': 0})
+            upcoming_days = int(request.args.get('upcoming', 0))
+            today = parse_calendar_date(request.args['date']) if request.args.get('date') \
+                else datetime.now().date()
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірна дата або період'})
 
-        blooming_plants = []
-        for plant in plants:
-            bloom_start_month = int(plant.get('bloom_start', '01.01').split('.')[1])
-            bloom_end_month = int(plant.get('bloom_end', '31.12').split('.')[1])
+        response_data['blooming_plants'] = blooming_plants
+        response_data['count'] = len(blooming_plants)
 
-            if bloom_start_month <= month <= bloom_end_month:
-                blooming_plants.append(plant)
+        if upcoming_days > 0:
+            response_data['upcoming'] = [dict(plant, days_until=days_until)
+                                         for days_until, plant in index.upcoming_starts(today, upcoming_days)]
 
-        return jsonify({
-            'success': True,
-            'month': month,
-            'month_name': get_month_name(month),
-            'blooming_plants': blooming_plants,
-            'count': len(blooming_plants)
-        })
+        return jsonify(response_data)
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
 # ==================== АНАЛІЗ ЛОКАЦІЇ ====================
+def get_forage_analyzer():
+    """Аналізатор угідь і кеш його результатів; перебудовуються після зміни медоносів чи угідь"""
+    global forage_analyzer_cache
+    sources = (data_store.get(HONEY_PLANTS_FILE), data_store.get(LAYERS_FILE), data_store.get(LOCATIONS_FILE))
+    if forage_analyzer_cache is None or any(a is not b for a, b in zip(forage_analyzer_cache[0], sources)):
+        analyzer = ForageAnalyzer(*(copy_records(source) for source in sources), cell_degrees=SPATIAL_GRID_DEGREES)
+        forage_analyzer_cache = (sources, analyzer, TTLCache(ANALYSIS_CACHE_SIZE))
+    return forage_analyzer_cache[1], forage_analyzer_cache[2]
+
+
 @app.route('/api/analyze-location', methods=['POST'])
 def analyze_location():
     try:
-        data = request.json
-        lat = data.get('lat', 50.45)
-        lon = data.get('lon', 30.52)
-        radius_km = data.get('radius', 3)
+        data = request.json or {}
+        try:
+            lat = float(data.get('lat', 50.45))
+            lon = float(data.get('lon', 30.52))
+            radius_km = round(float(data.get('radius', 3)), 1)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Невірні координати або радіус'})
+
+        if not 0 < radius_km <= ANALYSIS_MAX_RADIUS:
+            return jsonify({'success': False, 'message': f'Радіус має бути від 0 до {ANALYSIS_MAX_RADIUS} км'})
+
+        # Аналіз рахується для центру клітинки сітки, тож сусідні точки ділять результат
+        analyzer, cache = get_forage_analyzer()
+        cell = weather_cell(lat, lon, ANALYSIS_GRID_DEGREES)
+        cached = cache.get((cell, radius_km), ANALYSIS_CACHE_TTL)
+        if cached is not None:
+            result = cached[0]
+        else:
+            result = analyzer.analyze(cell[0], cell[1], radius_km)
+            cache.set((cell, radius_km), result)
 
-        # Симулюємо аналіз
-        potential_yield = random.uniform(50, 300)
+        potential_yield = result['potential_yield_kg']
         recommended_hives = max(1, int(potential_yield / 30))
         efficiency_score = min(100, int((potential_yield / 300) * 100))
 
-        # Отримуємо список рослин в радіусі
-        plants = load_data(HONEY_PLANTS_FILE)
-        nearby_plants = random.sample(plants, min(3, len(plants)))
-
         return jsonify({
             'success': True,
             'analysis': {
                 'location': {'lat': lat, 'lon': lon},
                 'radius_km': radius_km,
                 'potential_yield_kg': round(potential_yield, 2),
+                'forage_area_ha': round(result['forage_area_ha'], 2),
+                'forage_patches': result['patches'],
                 'recommended_hives': recommended_hives,
                 'efficiency_percent': efficiency_score,
-                'nearby_plants': nearby_plants,
+                'nearby_plants': result['nearby_plants'],
+                'cache': {'hit': cached is not None, 'cell': {'lat': cell[0], 'lon': cell[1]}},
                 'message': f'Потенційний збір: {round(potential_yield, 2)} кг. Рекомендовано вуликів: {recommended_hives}.'
+                if result['patches'] else 'У радіусі немає даних про медоносні угіддя.'
             }
         })
 
@@ -1084,6 +1615,11 @@ def analyze_location():
 # ==================== ПОГОДА ====================
 def get_demo_weather_data(lat, lon):
     """Повертає демо-дані погоди"""
+    return jsonify(build_demo_weather_payload(lat, lon))
+
+
+def build_demo_weather_payload(lat, lon):
+    """Генерує демо-дані погоди у форматі відповіді API"""
     current_date = datetime.now()
 
     # Генеруємо демо-дані на основі пори року
@@ -1146,7 +1682,7 @@ def get_demo_weather_data(lat, lon):
             'foraging_hours': foraging_hours
         })
 
-    return jsonify({
+    return {
         'success': True,
         'current': current_weather,
         'forecast': forecast,
@@ -1157,7 +1693,7 @@ def get_demo_weather_data(lat, lon):
         'demo_data': True,
         'message': 'Використовуються демо-дані. Додайте API ключ для реальної погоди.',
         'timestamp': datetime.now().isoformat()
-    })
+    }
 
 
 @app.route('/api/weather/forecast', methods=['GET'])
@@ -1220,193 +1756,251 @@ def get_weather():
         return jsonify({'success': False, 'message': f'Помилка отримання погоди: {str(e)}'})
 
 
-@app.route('/api/weather/real', methods=['GET'])
-def get_real_weather():
-    """Отримання реальної погоди за геолокацією"""
-    try:
-        lat = request.args.get('lat', 50.45)
-        lon = request.args.get('lon', 30.52)
+def fetch_openweather(endpoint, lat, lon, **params):
+    """Один запит до OpenWeatherMap через спільний пул з'єднань; повертає JSON або None.
 
-        # ВАШ НОВИЙ API КЛЮЧ
-        API_KEY = '2d5269ffcc91aebf9cb1193ca0507537'
+    Кожен результат враховує запобіжник; поки він відкритий, запит не виконується.
+    """
+    if not weather_breaker.allow():
+        print(f"⚡ Запобіжник OpenWeatherMap відкритий, пропускаю запит ({endpoint})")
+        return None
 
-        # Перевірка ключа
-        print(f"🔑 Використовую API ключ: {API_KEY[:8]}...")
-        print(f"📍 Запит погоди для координат: {lat}, {lon}")
+    params.update({'lat': lat, 'lon': lon, 'appid': WEATHER_API_KEY, 'units': 'metric', 'lang': 'ua'})
+    try:
+        response = weather_http.get(f'{WEATHER_API_URL}/{endpoint}', params=params, timeout=WEATHER_TIMEOUT)
 
-        # Використовуємо OpenWeatherMap API
-        current_url = f'https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric&lang=ua'
-        forecast_url = f'https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={API_KEY}&units=metric&lang=ua&cnt=40'
+        if response.status_code != 200:
+            print(f"⚠️ API помилка ({endpoint}): {response.status_code}")
+            print(f"📄 Відповідь: {response.text[:100]}")
+            weather_breaker.record_failure()
+            return None
 
-        # Робимо запити до API
-        print(f"🌤️ Запит поточної погоди...")
-        current_response = requests.get(current_url, timeout=10)
+        data = response.json()
+    except Exception as e:
+        print(f"⚠️ Помилка з'єднання з API ({endpoint}): {e}")
+        weather_breaker.record_failure()
+        return None
 
-        # Перевіряємо статус
-        if current_response.status_code != 200:
-            print(f"⚠️ API помилка: {current_response.status_code}")
-            print(f"📄 Відповідь: {current_response.text[:100]}")
-            # Повертаємо демо-дані
-            return get_demo_weather_data(lat, lon)
+    # Перевіряємо, чи API повернуло помилку (у /weather поле cod - число, у /forecast - рядок)
+    if str(data.get('cod')) != '200':
+        print(f"⚠️ API помилка ({endpoint}): {data.get('message', 'Невідома помилка API')}")
+        weather_breaker.record_failure()
+        return None
 
-        current_data = current_response.json()
+    weather_breaker.record_success()
+    return data
 
-        # Перевіряємо, чи API повернуло помилку
-        if current_data.get('cod') != 200:
-            error_msg = current_data.get('message', 'Невідома помилка API')
-            print(f"⚠️ API помилка: {error_msg}")
-            return get_demo_weather_data(lat, lon)
 
-        print(f"✅ Поточна погода отримана: {current_data.get('name', 'Невідомо')}")
+def weather_ttl(kind):
+    return WEATHER_CURRENT_TTL if kind == 'weather' else WEATHER_FORECAST_TTL
+
 
-        # Отримуємо прогноз
-        print(f"📅 Запит прогнозу погоди...")
-        forecast_response = requests.get(forecast_url, timeout=10)
+def refresh_upstream_weather(kind, cell, background=False):
+    """Запитує дані клітинки в OpenWeatherMap і кладе їх у кеш; невдалі запити не кешуються.
 
-        forecast_data = None
-        if forecast_response.status_code == 200:
-            forecast_data = forecast_response.json()
-            print(f"✅ Прогноз отримано: {len(forecast_data.get('list', []))} записів")
+    Фонове оновлення (background) пише лише у спільний кеш, щоб не витісняти з пам'яті
+    процесу записи, які запитують його користувачі.
+    """
+    def fetch():
+        lat, lon = cell
+        if kind == 'weather':
+            print(f"🌤️ Запит поточної погоди для {lat}, {lon}...")
+            data = fetch_openweather('weather', lat, lon)
         else:
-            print(f"⚠️ Не вдалося отримати прогноз: {forecast_response.status_code}")
-
-        # Обробка поточної погоди
-        current_weather = {
-            'temp': current_data['main']['temp'],
-            'feels_like': current_data['main']['feels_like'],
-            'humidity': current_data['main']['humidity'],
-            'pressure': current_data['main']['pressure'],
-            'wind_speed': current_data['wind']['speed'],
-            'weather': current_data['weather'],
-            'sunrise': current_data['sys']['sunrise'],
-            'sunset': current_data['sys']['sunset'],
-            'clouds': current_data.get('clouds', {}).get('all', 0),
-            'visibility': current_data.get('visibility', 10000)
-        }
+            print(f"📅 Запит прогнозу погоди для {lat}, {lon}...")
+            data = fetch_openweather('forecast', lat, lon, cnt=40)
 
-        # Обробка прогнозу (якщо є дані)
-        forecast = []
-        if forecast_data and forecast_data.get('list'):
-            daily_forecasts = {}
+        if data is not None:
+            weather_cache.set((kind, cell), data, local=not background)
+        return data
 
-            # Групуємо прогнози по днях
-            for item in forecast_data['list']:
-                date_time = datetime.fromtimestamp(item['dt'])
-                date = date_time.strftime('%Y-%m-%d')
-                if date not in daily_forecasts:
-                    daily_forecasts[date] = []
-                daily_forecasts[date].append(item)
+    # Одночасні запити тієї ж клітинки ділять один виклик API
+    return weather_flight.do((kind, cell), fetch)
 
-            # Видаляємо сьогоднішній день
-            today = datetime.now().strftime('%Y-%m-%d')
-            if today in daily_forecasts:
-                del daily_forecasts[today]
 
-            # Беремо наступні 3 дні
-            dates = sorted(daily_forecasts.keys())[:3]
+def get_upstream_weather(kind, cell):
+    """Дані OpenWeatherMap для клітинки сітки: з кешу або з API.
 
-            for date in dates:
-                day_forecasts = daily_forecasts[date]
+    Повертає (дані, чи з кешу, вік у секундах). Застарілий запис віддається
+    одразу, а його оновлення запускається у фоні.
+    """
+    weather_refresher.start()
+    weather_refresher.touch(cell)
 
-                if not day_forecasts:
-                    continue
+    cached = weather_cache.get((kind, cell), weather_ttl(kind))
+    if cached is not None:
+        return cached[0], True, cached[1]
 
-                # Знаходимо макс/мін температури
-                temps = [f['main']['temp'] for f in day_forecasts]
-                humidities = [f['main']['humidity'] for f in day_forecasts]
-                winds = [f['wind']['speed'] for f in day_forecasts]
-                conditions = [f['weather'][0]['main'] for f in day_forecasts]
-
-                # Знаходимо основний стан погоди
-                main_condition = max(set(conditions), key=conditions.count) if conditions else 'Clear'
-
-                # Визначення активності бджіл
-                temp_day = max(temps) if temps else current_weather['temp']
-                temp_night = min(temps) if temps else current_weather['temp'] - 5
-
-                if temp_day >= 15 and temp_day <= 28 and 'Rain' not in main_condition:
-                    bee_activity = 'висока'
-                    foraging_hours = 10
-                elif temp_day >= 10 and temp_day <= 30:
-                    bee_activity = 'середня'
-                    foraging_hours = 7
-                else:
-                    bee_activity = 'низька'
-                    foraging_hours = 4
-
-                # Сума опадів за день
-                precipitation = sum(
-                    f.get('rain', {}).get('3h', 0)
-                    for f in day_forecasts
-                    if f.get('rain')
-                )
-
-                forecast.append({
-                    'date': date,
-                    'temp_day': round(temp_day, 1),
-                    'temp_night': round(temp_night, 1),
-                    'humidity': round(sum(humidities) / len(humidities), 1) if humidities else current_weather[
-                        'humidity'],
-                    'wind_speed': round(sum(winds) / len(winds), 1) if winds else current_weather['wind_speed'],
-                    'precipitation': round(precipitation, 1),
-                    'condition': main_condition.lower(),
-                    'bee_activity': bee_activity,
-                    'foraging_hours': foraging_hours
-                })
-        else:
-            # Якщо немає прогнозу, генеруємо на основі поточних даних
-            print(f"ℹ️  Генерую прогноз на основі поточних даних")
-            for i in range(1, 4):
-                date = (datetime.now() + timedelta(days=i)).strftime('%Y-%m-%d')
-                temp_day = current_weather['temp'] + random.randint(-3, 3)
-                temp_night = current_weather['temp'] - random.randint(5, 10)
-
-                if temp_day >= 15 and temp_day <= 28 and 'Rain' not in current_weather['weather'][0]['main']:
-                    bee_activity = 'висока'
-                    foraging_hours = 10
-                elif temp_day >= 10 and temp_day <= 30:
-                    bee_activity = 'середня'
-                    foraging_hours = 7
-                else:
-                    bee_activity = 'низька'
-                    foraging_hours = 4
-
-                forecast.append({
-                    'date': date,
-                    'temp_day': temp_day,
-                    'temp_night': temp_night,
-                    'humidity': random.randint(55, 85),
-                    'wind_speed': current_weather['wind_speed'] + random.uniform(-1, 1),
-                    'precipitation': random.choice([0, 0, 0, 5, 10]),
-                    'condition': current_weather['weather'][0]['main'].lower(),
-                    'bee_activity': bee_activity,
-                    'foraging_hours': foraging_hours
-                })
+    stale = weather_cache.get_stale((kind, cell), WEATHER_STALE_TTL)
+    if stale is not None:
+        weather_refresh_executor.submit(refresh_upstream_weather, kind, cell)
+        return stale[0], True, stale[1]
 
-        # Форматуємо час сходу та заходу сонця
-        def format_timestamp(timestamp):
-            try:
-                return datetime.fromtimestamp(timestamp).strftime('%H:%M')
-            except:
-                return "00:00"
+    return refresh_upstream_weather(kind, cell), False, 0
 
-        current_weather['sunrise_formatted'] = format_timestamp(current_weather['sunrise'])
-        current_weather['sunset_formatted'] = format_timestamp(current_weather['sunset'])
 
-        print(f"✅ Дані погоди успішно оброблені")
+def refresh_weather_cell(cell):
+    """Фонове оновлення клітинки: ставить у чергу запити лише тих даних, що скоро застаріють"""
+    if weather_breaker.state == 'open':
+        return []
 
-        return jsonify({
-            'success': True,
-            'current': current_weather,
-            'forecast': forecast,
-            'location': {
-                'name': current_data.get('name', 'Невідомо'),
-                'country': current_data['sys']['country']
-            },
-            'timestamp': datetime.now().isoformat(),
-            'demo_data': False,
-            'message': 'Реальні дані погоди з OpenWeatherMap'
-        })
+    futures = []
+    for kind in ('weather', 'forecast'):
+        age = weather_cache.age((kind, cell))
+        if age is None or age >= weather_ttl(kind) * WEATHER_REFRESH_AHEAD:
+            futures.append(weather_refresh_executor.submit(refresh_upstream_weather, kind, cell, True))
+    return futures
+
+
+def apiary_weather_cells():
+    """Клітинки сітки всіх пасік з координатами"""
+    cells = set()
+    for apiary in db.all(APIARIES_FILE):
+        try:
+            cells.add(weather_cell(float(apiary['latitude']), float(apiary['longitude']), WEATHER_GRID_DEGREES))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return cells
+
+
+def build_weather_payload(current_data, forecast_data):
+    """Перетворює відповіді OpenWeatherMap на формат застосунку"""
+    # Обробка поточної погоди
+    current_weather = {
+        'temp': current_data['main']['temp'],
+        'feels_like': current_data['main']['feels_like'],
+        'humidity': current_data['main']['humidity'],
+        'pressure': current_data['main']['pressure'],
+        'wind_speed': current_data['wind']['speed'],
+        'weather': current_data['weather'],
+        'sunrise': current_data['sys']['sunrise'],
+        'sunset': current_data['sys']['sunset'],
+        'clouds': current_data.get('clouds', {}).get('all', 0),
+        'visibility': current_data.get('visibility', 10000)
+    }
+
+    # Обробка прогнозу (якщо є дані)
+    forecast = daily_forecast(forecast_data)
+    if not (forecast_data and forecast_data.get('list')):
+        # Якщо немає прогнозу, генеруємо на основі поточних даних
+        print(f"ℹ️  Генерую прогноз на основі поточних даних")
+        for i in range(1, 4):
+            date = (datetime.now() + timedelta(days=i)).strftime('%Y-%m-%d')
+            temp_day = current_weather['temp'] + random.randint(-3, 3)
+            temp_night = current_weather['temp'] - random.randint(5, 10)
+            bee_activity, foraging_hours = bee_activity_level(temp_day, current_weather['weather'][0]['main'])
+
+            forecast.append({
+                'date': date,
+                'temp_day': temp_day,
+                'temp_night': temp_night,
+                'humidity': random.randint(55, 85),
+                'wind_speed': current_weather['wind_speed'] + random.uniform(-1, 1),
+                'precipitation': random.choice([0, 0, 0, 5, 10]),
+                'condition': current_weather['weather'][0]['main'].lower(),
+                'bee_activity': bee_activity,
+                'foraging_hours': foraging_hours
+            })
+
+    # Форматуємо час сходу та заходу сонця
+    def format_timestamp(timestamp):
+        try:
+            return datetime.fromtimestamp(timestamp).strftime('%H:%M')
+        except:
+            return "00:00"
+
+    current_weather['sunrise_formatted'] = format_timestamp(current_weather['sunrise'])
+    current_weather['sunset_formatted'] = format_timestamp(current_weather['sunset'])
+
+    print(f"✅ Дані погоди успішно оброблені")
+
+    return {
+        'success': True,
+        'current': current_weather,
+        'forecast': forecast,
+        'location': {
+            'name': current_data.get('name', 'Невідомо'),
+            'country': current_data['sys']['country']
+        },
+        'timestamp': datetime.now().isoformat(),
+        'demo_data': False,
+        'message': 'Реальні дані погоди з OpenWeatherMap'
+    }
+
+
+def fetch_weather_cells(cells, executor=None, fanout=None):
+    """Погода для кількох клітинок сітки: {клітинка: відповідь або None, якщо API недоступне}.
+
+    Поточна погода і прогноз клітинок запитуються паралельно, але в пулі executor
+    одночасно перебуває не більше fanout запитів цього виклику. Те, що не встигло
+    за WEATHER_LATENCY_BUDGET, вважається недоступним: ще не розпочаті запити
+    скасовуються, а розпочаті продовжуються у фоні й поповнять кеш.
+    """
+    executor = executor or weather_executor
+    deadline = time.time() + WEATHER_LATENCY_BUDGET
+    queued = deque((kind, cell) for cell in cells for kind in ('weather', 'forecast'))
+    fanout = fanout or len(queued)
+    running, results = {}, {}
+    while queued or running:
+        while queued and len(running) < fanout:
+            kind, cell = queued.popleft()
+            running[executor.submit(get_upstream_weather, kind, cell)] = (kind, cell)
+        done, _ = wait(running, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            results[running.pop(future)] = future.result()
+    for future in running:
+        future.cancel()
+
+    def result_within_budget(kind, cell):
+        if (kind, cell) not in results:
+            print(f"⏱️ Перевищено час очікування погоди ({kind}) для {cell[0]}, {cell[1]}")
+            return None, False, 0
+        return results[(kind, cell)]
+
+    result = {}
+    for cell in cells:
+        current_data, current_hit, current_age = result_within_budget('weather', cell)
+        if current_data is None:
+            result[cell] = None
+            continue
+
+        forecast_data, forecast_hit, forecast_age = result_within_budget('forecast', cell)
+        if forecast_data is None:
+            print(f"⚠️ Не вдалося отримати прогноз")
+
+        payload = build_weather_payload(current_data, forecast_data)
+        payload['cache'] = {
+            'hit': current_hit and (forecast_hit or forecast_data is None),
+            'age_seconds': round(max(current_age, forecast_age)),
+            'current_age_seconds': round(current_age),
+            'forecast_age_seconds': round(forecast_age) if forecast_data is not None else None,
+            'stale': current_age > WEATHER_CURRENT_TTL or forecast_age > WEATHER_FORECAST_TTL,
+            'cell': {'lat': cell[0], 'lon': cell[1]}
+        }
+        result[cell] = payload
+    return result
+
+
+@app.route('/api/weather/real', methods=['GET'])
+def get_real_weather():
+    """Отримання реальної погоди за геолокацією"""
+    try:
+        lat = float(request.args.get('lat', 50.45))
+        lon = float(request.args.get('lon', 30.52))
+
+        print(f"📍 Запит погоди для координат: {lat}, {lon}")
+
+        # Сусідні пасіки потрапляють в одну клітинку сітки і ділять кеш
+        cell = weather_cell(lat, lon, WEATHER_GRID_DEGREES)
+        payload = fetch_weather_cells([cell])[cell]
+
+        if payload is None:
+            # Повертаємо демо-дані
+            return get_demo_weather_data(lat, lon)
+
+        return jsonify(payload)
 
     except Exception as e:
         print(f'❌ Помилка отримання погоди: {str(e)}')
@@ -1419,54 +2013,159 @@ def get_real_weather():
         )
 
 
-# ==================== СТАТИСТИКА ====================
-@app.route('/api/statistics/user', methods=['GET'])
-def get_user_statistics():
+@app.route('/api/weather/batch', methods=['GET', 'POST'])
+def get_weather_batch():
+    """Погода та прогноз активності бджіл для всіх пасік користувача одним запитом"""
     try:
-        user_id = request.args.get('user_id')
+        data = request.get_json(silent=True) or {}
+        user_id = data.get('user_id') or request.args.get('user_id')
+
+        # Пасіки користувача або довільний список координат
+        if data.get('locations'):
+            locations = [{
+                'apiary_id': loc.get('id') or loc.get('apiary_id'),
+                'name': loc.get('name'),
+                'lat': loc.get('lat', loc.get('latitude')),
+                'lon': loc.get('lon', loc.get('longitude'))
+            } for loc in data['locations']]
+        elif user_id:
+            locations = [{
+                'apiary_id': a['id'],
+                'name': a.get('name'),
+                'lat': a.get('latitude'),
+                'lon': a.get('longitude')
+            } for a in db.find(APIARIES_FILE, user_id=user_id)]
+        else:
+            return jsonify({'success': False, 'message': 'Вкажіть user_id або список координат'})
 
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Користувач не вказаний'})
+        if len(locations) > WEATHER_BATCH_LIMIT:
+            return jsonify({'success': False,
+                            'message': f'Забагато локацій (максимум {WEATHER_BATCH_LIMIT})'})
 
-        apiaries = load_data(APIARIES_FILE)
-        user_apiaries = [a for a in apiaries if a.get('user_id') == user_id]
+        # Пасіки з однієї клітинки сітки отримують один запит
+        for loc in locations:
+            try:
+                loc['cell'] = weather_cell(float(loc['lat']), float(loc['lon']), WEATHER_GRID_DEGREES)
+            except (TypeError, ValueError):
+                loc['cell'] = None
+        cells = list(dict.fromkeys(loc['cell'] for loc in locations if loc['cell'] is not None))
+
+        weather_by_cell = fetch_weather_cells(cells, weather_batch_executor, WEATHER_BATCH_FANOUT)
+
+        items = []
+        for loc in locations:
+            item = {'apiary_id': loc['apiary_id'], 'name': loc['name'],
+                    'location': {'lat': loc['lat'], 'lon': loc['lon']}}
+            if loc['cell'] is None:
+                item.update({'success': False, 'message': 'Не вказано координати'})
+            else:
+                if weather_by_cell[loc['cell']] is None:
+                    # Демо-дані генеруються один раз на клітинку
+                    weather_by_cell[loc['cell']] = build_demo_weather_payload(*loc['cell'])
+                payload = weather_by_cell[loc['cell']]
+                item.update({
+                    'success': True,
+                    'current': payload['current'],
+                    'forecast': payload['forecast'],
+                    'place': payload['location'],
+                    'demo_data': payload['demo_data'],
+                    'cache': payload.get('cache')
+                })
+            items.append(item)
 
-        notes = load_data(JOURNAL_FILE)
-        user_notes = [n for n in notes if n.get('user_id') == user_id]
+        return jsonify({
+            'success': True,
+            'items': items,
+            'count': len(items),
+            'distinct_locations': len(cells),
+            'timestamp': datetime.now().isoformat()
+        })
 
-        # Розрахунок статистики
-        total_hives = sum(a.get('hive_count', 0) for a in user_apiaries)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка отримання погоди: {str(e)}'})
 
-        # Температура
-        temps = [n.get('temperature') for n in user_notes if n.get('temperature') is not None]
-        avg_temp = sum(temps) / len(temps) if temps else 0
 
-        # Типи робіт
-        work_types = {}
-        for note in user_notes:
-            work_type = note.get('work_type', 'інше')
-            work_types[work_type] = work_types.get(work_type, 0) + 1
+# ==================== СТАТИСТИКА ====================
+def rollup_avg_temperature(stats):
+    """Середня температура за сумою та кількістю непорожніх значень (None, якщо даних немає)"""
+    count = stats['counts']['temperature']
+    return round(stats['sums']['temperature'] / count, 1) if count else None
+
+
+def work_type_distribution(histogram):
+    """Гістограма типів робіт; нотатки без типу рахуються як 'інше'"""
+    work_types = {}
+    for work_type, count in histogram.items():
+        work_type = 'інше' if work_type is None else work_type
+        work_types[work_type] = work_types.get(work_type, 0) + count
+    return work_types
+
+
+def merge_rollup_buckets(target, bucket):
+    """Додає кошик зведення до іншого (кількість, суми, непорожні значення, гістограми)"""
+    if target is None:
+        return bucket
+    merged = {
+        'count': target['count'] + bucket['count'],
+        'sums': dict(target['sums']),
+        'counts': dict(target['counts']),
+        'histograms': {name: dict(histogram) for name, histogram in target['histograms'].items()}
+    }
+    for field, total in bucket['sums'].items():
+        merged['sums'][field] = merged['sums'].get(field, 0) + total
+    for field, count in bucket['counts'].items():
+        merged['counts'][field] = merged['counts'].get(field, 0) + count
+    for name, histogram in bucket['histograms'].items():
+        target_histogram = merged['histograms'].setdefault(name, {})
+        for value, count in histogram.items():
+            target_histogram[value] = target_histogram.get(value, 0) + count
+    return merged
+
+
+def rollup_summary(bucket):
+    """Кошик зведення нотаток у форматі відповіді"""
+    summary = {
+        'count': bucket['count'],
+        'hives_affected': bucket['sums']['hives_affected'],
+        'avg_temperature': rollup_avg_temperature(bucket)
+    }
+    if 'work_type' in bucket['histograms']:
+        summary['work_types'] = work_type_distribution(bucket['histograms']['work_type'])
+    return summary
+
+
+def build_user_statistics(user_id):
+    """Статистика користувача з агрегатів, що підтримуються інкрементно при кожній зміні"""
+    month_ago = (datetime.now() - timedelta(days=31)).isoformat()
+    apiary_stats = db.aggregate(APIARIES_FILE, 'user_id', user_id, top=3)
+    note_stats = db.aggregate(JOURNAL_FILE, 'user_id', user_id, top=5,
+                              at_least={'created_at': month_ago})
+
+    avg_temp = rollup_avg_temperature(note_stats)
+
+    return {
+        'apiaries_count': apiary_stats['count'],
+        'total_hives': apiary_stats['sums']['hive_count'],
+        'journal_entries': note_stats['count'],
+        'avg_temperature': avg_temp if avg_temp is not None else 'н/д',
+        'work_types_distribution': work_type_distribution(note_stats['histograms']['work_type']),
+        'recent_notes': note_stats['top']['created_at'],
+        'top_apiaries': apiary_stats['top']['hive_count'],
+        'total_notes_last_month': note_stats['at_least']['created_at']
+    }
+
 
-        # Останні нотатки
-        recent_notes = sorted(user_notes, key=lambda x: x.get('created_at', ''), reverse=True)[:5]
+@app.route('/api/statistics/user', methods=['GET'])
+def get_user_statistics():
+    try:
+        user_id = request.args.get('user_id')
 
-        # Пасіки з найбільшою кількістю вуликів
-        top_apiaries = sorted(user_apiaries, key=lambda x: x.get('hive_count', 0), reverse=True)[:3]
+        if not user_id:
+            return jsonify({'success': False, 'message': 'Користувач не вказаний'})
 
         return jsonify({
             'success': True,
-            'statistics': {
-                'apiaries_count': len(user_apiaries),
-                'total_hives': total_hives,
-                'journal_entries': len(user_notes),
-                'avg_temperature': round(avg_temp, 1) if avg_temp else 'н/д',
-                'work_types_distribution': work_types,
-                'recent_notes': recent_notes,
-                'top_apiaries': top_apiaries,
-                'total_notes_last_month': len([n for n in user_notes
-                                               if (datetime.now() - datetime.fromisoformat(
-                        n.get('created_at', datetime.now().isoformat()))).days <= 30])
-            }
+            'statistics': build_user_statistics(user_id)
         })
 
     except Exception as e:
@@ -1483,46 +2182,44 @@ def get_apiary_statistics(apiary_id):
             return jsonify({'success': False, 'message': 'ID пасіки або користувача не вказано'})
 
         # Перевіряємо, чи пасіка належить користувачу
-        apiaries = load_data(APIARIES_FILE)
-        apiary = next((a for a in apiaries if a['id'] == apiary_id and a['user_id'] == user_id), None)
+        apiary = db.find_one(APIARIES_FILE, id=apiary_id, user_id=user_id)
 
         if not apiary:
             return jsonify({'success': False, 'message': 'Пасіку не знайдено'})
 
-        # Отримуємо нотатки для цієї пасіки
-        notes = load_data(JOURNAL_FILE)
-        apiary_notes = [n for n in notes if n.get('apiary_id') == apiary_id]
-
-        # Розрахунок статистики
-        total_notes = len(apiary_notes)
-
-        # Температура
-        temps = [n.get('temperature') for n in apiary_notes if n.get('temperature') is not None]
-        avg_temp = sum(temps) / len(temps) if temps else 0
+        # Діапазон місяців для графіка: from/to у форматі YYYY-MM (або повні дати)
+        month_from = (request.args.get('from') or '')[:7] or None
+        month_to = (request.args.get('to') or '')[:7] or None
 
-        # Типи робіт
-        work_types = {}
-        for note in apiary_notes:
-            work_type = note.get('work_type', 'інше')
-            work_types[work_type] = work_types.get(work_type, 0) + 1
+        # Статистика та зведення нотаток пасіки підтримуються інкрементно
+        note_stats = db.aggregate(JOURNAL_FILE, 'apiary_id', apiary_id, top=5,
+                                  rollups={'month': (month_from, month_to), 'work_type': (None, None)})
+        avg_temp = rollup_avg_temperature(note_stats)
 
-        # Останні нотатки
-        recent_notes = sorted(apiary_notes, key=lambda x: x.get('created_at', ''), reverse=True)[:5]
+        notes_by_month = {month: rollup_summary(bucket)
+                          for month, bucket in sorted(note_stats['rollups']['month'].items())
+                          if month is not None}
 
-        # Загальна кількість задіяних вуликів
-        total_hives_affected = sum(n.get('hives_affected', 0) for n in apiary_notes)
+        # Нотатки без типу і з типом 'інше' - один кошик, як у work_type_distribution
+        work_type_buckets = {}
+        for work_type, bucket in note_stats['rollups']['work_type'].items():
+            work_type = 'інше' if work_type is None else work_type
+            work_type_buckets[work_type] = merge_rollup_buckets(work_type_buckets.get(work_type), bucket)
+        notes_by_work_type = {work_type: rollup_summary(bucket) for work_type, bucket in work_type_buckets.items()}
 
         return jsonify({
             'success': True,
             'statistics': {
                 'apiary_name': apiary['name'],
-                'total_notes': total_notes,
-                'avg_temperature': round(avg_temp, 1) if avg_temp else 'н/д',
-                'work_types_distribution': work_types,
-                'recent_notes': recent_notes,
-                'total_hives_affected': total_hives_affected,
+                'total_notes': note_stats['count'],
+                'avg_temperature': avg_temp if avg_temp is not None else 'н/д',
+                'work_types_distribution': work_type_distribution(note_stats['histograms']['work_type']),
+                'recent_notes': note_stats['top']['created_at'],
+                'total_hives_affected': note_stats['sums']['hives_affected'],
                 'hive_count': apiary.get('hive_count', 0),
-                'notes_by_month': {},  # Можна додати розрахунок по місяцях
+                'notes_by_month': notes_by_month,
+                'notes_by_work_type': notes_by_work_type,
+                'period': {'from': month_from, 'to': month_to},
                 'last_updated': apiary.get('updated_at', apiary.get('created_at'))
             }
         })
@@ -1531,6 +2228,68 @@ def get_apiary_statistics(apiary_id):
         return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
 
 
+# ==================== ДАШБОРД ====================
+DASHBOARD_SECTIONS = ('profile', 'apiaries', 'statistics', 'notifications')
+
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Дані головного екрана одним запитом: профіль, пасіки, статистика, сповіщення.
+
+    sections - список секцій через кому (за замовчуванням усі); limit та cursor
+    стосуються списку пасік. Усі секції рахуються з одного узгодженого знімка даних.
+    """
+    try:
+        user_id = request.args.get('user_id')
+
+        if not user_id:
+            return jsonify({'success': False, 'message': 'Користувач не вказаний'})
+
+        sections = [name.strip() for name in request.args.get('sections', '').split(',') if name.strip()]
+        sections = sections or list(DASHBOARD_SECTIONS)
+        unknown = [name for name in sections if name not in DASHBOARD_SECTIONS]
+        if unknown:
+            return jsonify({'success': False, 'message': f'Невідомі секції: {", ".join(unknown)}'})
+
+        try:
+            limit, cursor = get_page_params()
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
+
+        response_data = {'success': True, 'sections': sections}
+
+        with db.snapshot():
+            user = db.get(USERS_FILE, user_id)
+            if not user:
+                return jsonify({'success': False, 'message': 'Користувача не знайдено'})
+
+            if 'profile' in sections:
+                response_data['profile'] = build_profile(user)
+
+            if 'apiaries' in sections:
+                user_apiaries, next_cursor = db.find_page(APIARIES_FILE, limit=limit, cursor=cursor,
+                                                          user_id=user_id)
+                response_data['apiaries'] = {
+                    'apiaries': user_apiaries,
+                    'count': len(user_apiaries),
+                    'next_cursor': next_cursor
+                }
+
+            if 'statistics' in sections:
+                response_data['statistics'] = build_user_statistics(user_id)
+
+            if 'notifications' in sections:
+                response_data['notifications'] = summarize_notifications(user_id)
+
+        response_data['timestamp'] = datetime.now().isoformat()
+        return jsonify(response_data)
+
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Невірні параметри пагінації'})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Помилка: {str(e)}'})
+
+
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
@@ -1549,11 +2308,14 @@ if __name__ == '__main__':
     print("\n📊 Доступні ендпоінти:")
     print("   /api/health            - Перевірка сервера")
     print("   /api/test              - Тестовий endpoint")
+    print("   /api/diagnostics       - Діагностика сервера")
     print("   /api/register          - Реєстрація")
     print("   /api/login             - Вхід")
     print("   /api/profile           - Профіль")
+    print("   /api/dashboard         - Головний екран одним запитом")
     print("   /api/update-profile    - Оновити профіль")
     print("   /api/apiaries          - Список пасік")
+    print("   /api/apiaries/nearby   - Пасіки поблизу")
     print("   /api/apiary/<id>       - Отримати пасіку")
     print("   /api/add-apiary        - Додати пасіку")
     print("   /api/update-apiary     - Оновити пасіку")
@@ -1565,14 +2327,20 @@ if __name__ == '__main__':
     print("   /api/delete-journal-note - Видалити нотатку")
     print("   /api/honey-plants      - Медоноси")
     print("   /api/bloom-calendar    - Календар цвітіння")
+    print("   /api/cooperation/match - Підбір пасічників для запилення")
     print("   /api/notifications     - Сповіщення")
+    print("   /api/notifications/unread-count - Кількість непрочитаних")
+    print("   /api/notifications/generate - Сформувати сповіщення для всіх пасік")
+    print("   /api/events/stream     - Потік подій (SSE)")
     print("   /api/weather/forecast  - Демо погода")
     print("   /api/weather/real      - Реальна погода")
+    print("   /api/weather/batch     - Погода для всіх пасік")
     print("   /api/statistics/user   - Статистика користувача")
     print("   /api/statistics/apiary/<id> - Статистика пасіки")
     print("   /api/analyze-location  - Аналіз локації")
     print("   /api/cooperation/*     - Співпраця пасічник-фермер")
     print("=" * 60)
-    print(f"🔑 API ключ OpenWeatherMap: 2d5269ffcc91aebf9cb1193ca0507537")
+    print(f"🔑 API ключ OpenWeatherMap: {WEATHER_API_KEY[:8]}...")
     print("=" * 60)
+    weather_refresher.start()
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,200 @@
+# backend/bloom.py
+"""Індекс періодів цвітіння медоносів за днем року"""
+import bisect
+from datetime import date
+
+# Дні року рахуються за високосним роком, щоб 29.02 мало свій день (1..366)
+_REFERENCE_YEAR = 2000
+DAYS_IN_YEAR = 366
+
+
+def day_of_year(day, month):
+    """Номер дня року для дати DD.MM (1..366)"""
+    return date(_REFERENCE_YEAR, month, day).timetuple().tm_yday
+
+
+def parse_day_month(value):
+    """Розбирає рядок 'DD.MM' у номер дня року; ValueError, якщо формат невірний"""
+    day, month = value.strip().split('.')[:2]
+    return day_of_year(int(day), int(month))
+
+
+def parse_bloom_period(value):
+    """Розбирає період 'DD.MM - DD.MM' у (день початку, день кінця); ValueError, якщо формат невірний"""
+    start, end = value.split('-')
+    return parse_day_month(start), parse_day_month(end)
+
+
+def _segments(start, end):
+    """Період як відрізки днів року без переходу через Новий рік"""
+    if start <= end:
+        return [(start, end)]
+    return [(start, DAYS_IN_YEAR), (1, end)]
+
+
+def period_days(start, end):
+    """Тривалість періоду в днях (включно з обома кінцями)"""
+    return sum(high - low + 1 for low, high in _segments(start, end))
+
+
+def overlap_days(first, second):
+    """Кількість спільних днів двох періодів (start, end), кожен може переходити через Новий рік"""
+    return sum(max(0, min(high1, high2) - max(low1, low2) + 1)
+               for low1, high1 in _segments(*first) for low2, high2 in _segments(*second))
+
+
+def date_day_of_year(value):
+    """День року для date/datetime (рік не враховується)"""
+    return day_of_year(value.day, value.month)
+
+
+def _reference_date(doy):
+    return date.fromordinal(date(_REFERENCE_YEAR, 1, 1).toordinal() + doy - 1)
+
+
+def format_day_of_year(doy):
+    """Зворотне перетворення номера дня року в 'DD.MM'"""
+    return _reference_date(doy).strftime('%d.%m')
+
+
+def date_in_year(year, day, month):
+    """Дата DD.MM у заданому році; 29.02 невисокосного року - це 01.03"""
+    try:
+        return date(year, month, day)
+    except ValueError:
+        if (day, month) != (29, 2):
+            raise
+        return date(year, 3, 1)
+
+
+def next_occurrence(doy, today):
+    """Найближча після today календарна дата дня року doy"""
+    reference = _reference_date(doy)
+    result = date_in_year(today.year, reference.day, reference.month)
+    if result <= today:
+        result = date_in_year(today.year + 1, reference.day, reference.month)
+    return result
+
+
+class _Node:
+    __slots__ = ('center', 'left', 'right', 'by_start', 'by_end')
+
+    def __init__(self, center):
+        self.center = center
+        self.left = None
+        self.right = None
+        self.by_start = []
+        self.by_end = []
+
+
+def _build(intervals):
+    """Центроване дерево інтервалів: у вузлі - інтервали, що містять його центр"""
+    if not intervals:
+        return None
+    points = sorted(p for start, end, _ in intervals for p in (start, end))
+    node = _Node(points[len(points) // 2])
+    left, right = [], []
+    for interval in intervals:
+        if interval[1] < node.center:
+            left.append(interval)
+        elif interval[0] > node.center:
+            right.append(interval)
+        else:
+            node.by_start.append(interval)
+    node.by_end = sorted(node.by_start, key=lambda i: i[1], reverse=True)
+    node.by_start.sort(key=lambda i: i[0])
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+
+class BloomIndex:
+    """Дерево інтервалів над періодами цвітіння за днем року.
+
+    Період, що переходить через Новий рік (наприклад, 15.12-15.01), ділиться на
+    два інтервали. Запити «що цвіте в день D» та «що цвіте у вікні [D1, D2]»
+    виконуються за O(log n + k), «початок цвітіння в найближчі N днів» -
+    двійковим пошуком по відсортованих датах початку.
+    """
+
+    def __init__(self, plants):
+        self.plants = []
+        intervals = []
+        starts = []
+        for plant in plants:
+            try:
+                start = parse_day_month(plant.get('bloom_start') or '01.01')
+                end = parse_day_month(plant.get('bloom_end') or '31.12')
+            except (AttributeError, TypeError, ValueError):
+                continue
+            position = len(self.plants)
+            self.plants.append(plant)
+            starts.append((start, position))
+            if start <= end:
+                intervals.append((start, end, position))
+            else:
+                intervals.append((start, DAYS_IN_YEAR, position))
+                intervals.append((1, end, position))
+        self._root = _build(intervals)
+        self._starts = sorted(starts)
+
+    def _collect(self, node, low, high, found):
+        while node is not None:
+            if high < node.center:
+                for start, _, position in node.by_start:
+                    if start > high:
+                        break
+                    found.add(position)
+                node = node.left
+            elif low > node.center:
+                for _, end, position in node.by_end:
+                    if end < low:
+                        break
+                    found.add(position)
+                node = node.right
+            else:
+                found.update(position for _, _, position in node.by_start)
+                self._collect(node.left, low, high, found)
+                node = node.right
+
+    def _plants(self, positions):
+        """Рослини в порядку каталогу"""
+        return [self.plants[position] for position in sorted(positions)]
+
+    def blooming_on(self, doy):
+        """Рослини, що цвітуть у день року doy"""
+        return self.blooming_between(doy, doy)
+
+    def blooming_between(self, start, end):
+        """Рослини, період цвітіння яких перетинається з вікном [start, end].
+
+        Вікно, у якого start > end, переходить через Новий рік.
+        """
+        found = set()
+        if start <= end:
+            self._collect(self._root, start, end, found)
+        else:
+            self._collect(self._root, start, DAYS_IN_YEAR, found)
+            self._collect(self._root, 1, end, found)
+        return self._plants(found)
+
+    def upcoming_starts(self, today, days):
+        """Рослини, що почнуть цвісти протягом days днів після дати today: [(через скільки днів, рослина)].
+
+        Індекс за днем року лише відбирає кандидатів (з запасом на 29.02, якого
+        немає в невисокосному році), а відстань рахується за календарем.
+        """
+        days = min(days, DAYS_IN_YEAR - 1)
+        doy = date_day_of_year(today)
+        found = {}
+        low, high = doy + 1, doy + days + 1
+        for offset in (0, DAYS_IN_YEAR):
+            # Другий прохід - початки цвітіння наступного року
+            first = bisect.bisect_left(self._starts, (low - offset,))
+            last = bisect.bisect_right(self._starts, (high - offset, len(self.plants)))
+            for start, position in self._starts[first:last]:
+                days_until = (next_occurrence(start, today) - today).days
+                if days_until <= days:
+                    found.setdefault(position, days_until)
+        return [(days_until, self.plants[position])
+                for position, days_until in sorted(found.items(), key=lambda item: (item[1], item[0]))]
@@ -0,0 +1,85 @@
+# backend/events.py
+"""Пробудження потоків подій (Server-Sent Events) при змінах даних користувача"""
+import json
+import threading
+
+
+def format_sse(event_id, event, data):
+    """Повідомлення у форматі text/event-stream"""
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class EventHub:
+    """Версії подій за ключем (user_id) і очікування на їхню зміну.
+
+    Сам вміст подій не зберігається: потік після пробудження перечитує дані
+    зі сховища, тож hub лише будить потрібні з'єднання цього процесу.
+    Очікувач не тримає нічого, крім threading.Event, тому тисячі простоюючих
+    з'єднань коштують лише їхніх потоків (воркери gthread, див. gunicorn.conf.py).
+    """
+
+    def __init__(self, max_streams=None):
+        self.max_streams = max_streams
+        self._versions = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.rejected_streams = 0
+        self.published = 0
+        self.wakeups = 0
+
+    def open_stream(self):
+        """Займає місце для потоку подій; False, якщо вже відкрито max_streams потоків"""
+        with self._lock:
+            if self.max_streams is not None and self.streams >= self.max_streams:
+                self.rejected_streams += 1
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def version(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def publish(self, key):
+        """Позначає зміну для ключа та будить усіх, хто на нього чекає"""
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self.published += 1
+            waiters = list(self._waiters.get(key, ()))
+        for event in waiters:
+            event.set()
+        self.wakeups += len(waiters)
+
+    def wait(self, key, version, timeout):
+        """Чекає, поки версія ключа зміниться відносно version; False, якщо минув timeout"""
+        event = threading.Event()
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return True
+            self._waiters.setdefault(key, set()).add(event)
+        try:
+            return event.wait(timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': self.streams,
+                'max_streams': self.max_streams,
+                'rejected_streams': self.rejected_streams,
+                'waiting': sum(len(waiters) for waiters in self._waiters.values()),
+                'keys': len(self._waiters),
+                'published': self.published,
+                'wakeups': self.wakeups
+            }
@@ -0,0 +1,17 @@
+# backend/gunicorn.conf.py
+"""Налаштування gunicorn: потокові воркери для довгих з'єднань потоку подій (SSE)"""
+import os
+
+# Кожне SSE-з'єднання займає потік воркера, а не весь процес, і не блокує його heartbeat,
+# тож arbiter не вбиває воркер через timeout. Потоків подій на воркер не більше
+# STREAM_MAX_CLIENTS (див. app.py) - решта threads лишається для REST API
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# Під час перезапуску воркер чекає завершення запитів; потоки подій закриваються
+# самі через STREAM_MAX_SECONDS, тож після цього воркер виходить штатно і встигає
+# записати відкладені зміни (час входу тощо)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT',
+                                      float(os.environ.get('STREAM_MAX_SECONDS', 60)) + 30))
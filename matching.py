@@ -0,0 +1,96 @@
+# backend/matching.py
+"""Підбір пасічників для запилення за відстанню, кількістю вуликів і зайнятістю в період цвітіння"""
+import math
+
+from bloom import format_day_of_year, overlap_days, parse_bloom_period, period_days
+
+# Ваги складових оцінки: близькість пасік, вільні вулики, вільний період цвітіння
+DISTANCE_WEIGHT = 0.35
+HIVES_WEIGHT = 0.35
+BLOOM_WEIGHT = 0.3
+
+
+def hives_for_area(area_ha, hives_per_ha):
+    """Кількість вуликів для запилення площі (щонайменше один)"""
+    try:
+        area_ha = float(area_ha or 0)
+    except (TypeError, ValueError):
+        area_ha = 0
+    return max(1, math.ceil(area_ha * hives_per_ha))
+
+
+def commitment_conflicts(commitments, window, user_ids):
+    """Прийняті заявки пасічників user_ids, що перетинаються з вікном: {user_id: [(днів перетину, заявка)]}"""
+    conflicts = {}
+    for commitment in commitments:
+        user_id = commitment.get('to_user_id')
+        if user_id not in user_ids:
+            continue
+        try:
+            period = parse_bloom_period(commitment.get('bloom_period') or '')
+        except (AttributeError, TypeError, ValueError):
+            continue
+        days = overlap_days(window, period)
+        if days:
+            conflicts.setdefault(user_id, []).append((days, commitment))
+    return conflicts
+
+
+def rank_beekeepers(nearby, commitments, window, radius_km, hives_needed, hives_per_ha, exclude_user_id=None):
+    """Пасічники з пасіками поблизу, від найкращого: оцінка 0..100 і її складові.
+
+    nearby - [(відстань у км, пасіка)] з просторового індексу, commitments - прийняті
+    заявки на запилення. Вулики, зайняті заявками, що перетинаються з вікном цвітіння
+    window (start, end), не вважаються вільними.
+    """
+    by_user = {}
+    for distance, apiary in nearby:
+        user_id = apiary.get('user_id')
+        if user_id is None or user_id == exclude_user_id:
+            continue
+        by_user.setdefault(user_id, []).append((distance, apiary))
+
+    window_days = period_days(*window)
+    conflicts = commitment_conflicts(commitments, window, by_user)
+
+    ranked = []
+    for user_id, apiaries in by_user.items():
+        nearest_km = apiaries[0][0]
+        hive_count = sum(int(apiary.get('hive_count') or 0) for _, apiary in apiaries)
+        user_conflicts = sorted(conflicts.get(user_id, []), key=lambda item: item[0], reverse=True)
+        busy_hives = sum(hives_for_area(c.get('area_ha'), hives_per_ha) for _, c in user_conflicts)
+        available_hives = max(0, hive_count - busy_hives)
+        bloom_fit = 1 - (user_conflicts[0][0] / window_days if user_conflicts else 0)
+
+        distance_score = 1 - nearest_km / radius_km
+        hives_score = min(1.0, available_hives / hives_needed)
+        score = DISTANCE_WEIGHT * distance_score + HIVES_WEIGHT * hives_score + BLOOM_WEIGHT * bloom_fit
+
+        ranked.append({
+            'user_id': user_id,
+            'score': round(score * 100, 1),
+            'distance_km': round(nearest_km, 3),
+            'hive_count': hive_count,
+            'available_hives': available_hives,
+            'bloom_fit_percent': round(bloom_fit * 100, 1),
+            'conflicts': [{
+                'request_id': c.get('id'),
+                'crop': c.get('crop'),
+                'bloom_period': c.get('bloom_period'),
+                'overlap_days': days
+            } for days, c in user_conflicts],
+            'apiaries': [{
+                'id': apiary.get('id'),
+                'name': apiary.get('name'),
+                'distance_km': round(distance, 3),
+                'hive_count': apiary.get('hive_count', 0)
+            } for distance, apiary in apiaries]
+        })
+
+    ranked.sort(key=lambda m: (-m['score'], m['distance_km'], str(m['user_id'])))
+    return ranked
+
+
+def window_label(window):
+    """Вікно цвітіння у форматі 'DD.MM - DD.MM'"""
+    return f'{format_day_of_year(window[0])} - {format_day_of_year(window[1])}'
@@ -0,0 +1,33 @@
+# backend/migrate_to_sqlite.py
+import json
+import os
+
+from schema import (JOURNAL_FILE, JOURNAL_LOG_FILE, NOTIFICATIONS_FILE, NOTIFICATIONS_LOG_FILE, SQLITE_PATH,
+                    SQLITE_TABLES)
+from storage import JournalLog, SqliteBackend
+
+
+def load_json(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def migrate_to_sqlite(path=SQLITE_PATH):
+    backend = SqliteBackend(path, SQLITE_TABLES)
+
+    for filename in SQLITE_TABLES:
+        records = load_json(filename)
+
+        # Якщо колекцію вели у форматі JSONL, беремо актуальний стан звідти
+        log_file = {JOURNAL_FILE: JOURNAL_LOG_FILE, NOTIFICATIONS_FILE: NOTIFICATIONS_LOG_FILE}.get(filename)
+        if log_file and os.path.exists(log_file):
+            records = JournalLog(log_file).all()
+
+        count = backend.import_records(filename, records)
+        print(f'Імпортовано {count} записів з {filename}')
+
+
+if __name__ == '__main__':
+    migrate_to_sqlite()
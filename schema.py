@@ -0,0 +1,68 @@
+# backend/schema.py
+"""Колекції застосунку: файли, таблиці SQLite, індекси та агрегати.
+
+Спільні для веб-застосунку та скриптів міграції, тож модуль не має залежностей
+від Flask і не відкриває сховище.
+"""
+import os
+
+# Файли для зберігання даних
+USERS_FILE = 'users.json'
+APIARIES_FILE = 'apiaries.json'
+JOURNAL_FILE = 'journal.json'
+VERIFICATIONS_FILE = 'verifications.json'
+REVIEWS_FILE = 'reviews.json'
+LAYERS_FILE = 'layers.json'
+HONEY_PLANTS_FILE = 'honey_plants.json'
+NOTIFICATIONS_FILE = 'notifications.json'
+ROUTES_FILE = 'routes.json'
+COOPERATION_FILE = 'cooperation.json'
+LOCATIONS_FILE = 'locations.json'
+JOURNAL_LOG_FILE = 'journal.jsonl'
+NOTIFICATIONS_LOG_FILE = 'notifications.jsonl'
+
+# Файл бази даних бекенду SQLite
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'beeplanner.db')
+
+# Колекції, які бекенд SQLite тримає в таблицях, та їхні індекси
+SQLITE_TABLES = {
+    USERS_FILE: ('users', [('email',)]),
+    APIARIES_FILE: ('apiaries', [('user_id', 'created_at', 'id')]),
+    JOURNAL_FILE: ('journal_notes', [('user_id', 'created_at', 'id'), ('apiary_id', 'created_at', 'id')]),
+    NOTIFICATIONS_FILE: ('notifications', [('user_id', 'created_at')]),
+    COOPERATION_FILE: ('cooperation_requests', [('to_user_id', 'created_at'), ('from_user_id', 'created_at')])
+}
+
+# Поля, за якими JSON-бекенд тримає хеш-індекси в пам'яті (id індексується завжди)
+JSON_INDEXES = {
+    USERS_FILE: ('email',),
+    APIARIES_FILE: ('user_id',),
+    JOURNAL_FILE: ('user_id', 'apiary_id'),
+    NOTIFICATIONS_FILE: ('user_id',),
+    COOPERATION_FILE: ('to_user_id', 'from_user_id')
+}
+
+# Агрегати для статистики, що підтримуються інкрементно разом з індексами:
+# {файл: {поле групування: суми, гістограми та рейтинги (див. storage.GroupAggregate)}}
+AGGREGATES = {
+    APIARIES_FILE: {
+        'user_id': {'sums': ('hive_count',), 'rankings': {'hive_count': 'hive_count'}}
+    },
+    JOURNAL_FILE: {
+        'user_id': {'sums': ('temperature',), 'histograms': {'work_type': ('work_type', None)},
+                    'rankings': {'created_at': 'created_at'}},
+        # Помісячні зведення та зведення за типами робіт для графіків пасіки
+        'apiary_id': {'sums': ('temperature', 'hives_affected'), 'histograms': {'work_type': ('work_type', None)},
+                      'rankings': {'created_at': 'created_at'},
+                      'rollups': {'month': ('created_at', 7), 'work_type': ('work_type', None)}}
+    },
+    # Лічильник непрочитаних сповіщень користувача: count мінус кількість is_read=True
+    NOTIFICATIONS_FILE: {
+        'user_id': {'histograms': {'is_read': ('is_read', None)}}
+    }
+}
+
+# Колекції з просторовим індексом: {файл: (поле широти, поле довготи)}
+GEO_INDEXES = {
+    APIARIES_FILE: ('latitude', 'longitude')
+}
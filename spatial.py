@@ -0,0 +1,207 @@
+# backend/spatial.py
+"""Просторовий аналіз медоносних угідь навколо точки"""
+import math
+from operator import mul
+
+EARTH_RADIUS_KM = 6371.0
+# Найкоротший градус широти в км - для оцінок «не ближче ніж»
+KM_PER_DEGREE_MIN = 110.5
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Відстань по великому колу (формула гаверсинусів)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def circle_overlap_fraction(distance, radius):
+    """Частка площі кола радіуса radius, яку перекриває таке саме коло на відстані distance"""
+    if distance >= 2 * radius:
+        return 0.0
+    lens = 2 * radius ** 2 * math.acos(distance / (2 * radius)) - distance / 2 * math.sqrt(4 * radius ** 2 - distance ** 2)
+    return lens / (math.pi * radius ** 2)
+
+
+def forage_patches(layers, locations):
+    """Розгортає угіддя у плями (lat, lon, plant_id, area_ha).
+
+    layers.json: [{id, name, plant_id, lat, lon, area_ha}] - одна культура на угіддя.
+    locations.json: [{id, name, lat, lon, plants: [{plant_id, area_ha}]}] - змішані
+    угіддя (ліс, поле фермера) з кількома культурами.
+    """
+    for layer in layers:
+        yield layer.get('lat'), layer.get('lon'), layer.get('plant_id'), layer.get('area_ha')
+    for location in locations:
+        for plant in location.get('plants') or []:
+            yield location.get('lat'), location.get('lon'), plant.get('plant_id'), plant.get('area_ha')
+
+
+class GridIndex:
+    """Просторовий індекс точок на сітці градусів: кошик -> номери точок"""
+
+    def __init__(self, points, cell_degrees=0.05):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        for position, (lat, lon) in enumerate(points):
+            self.cells.setdefault(self._cell(lat, lon), []).append(position)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def candidates(self, lat, lon, radius_km):
+        """Номери точок у кошиках, що перетинають квадрат навколо кола радіуса radius_km"""
+        d_lat = radius_km / 111.32
+        d_lon = radius_km / (111.32 * max(0.01, math.cos(math.radians(lat))))
+        low_lat, low_lon = self._cell(lat - d_lat, lon - d_lon)
+        high_lat, high_lon = self._cell(lat + d_lat, lon + d_lon)
+        found = []
+        for cell_lat in range(low_lat, high_lat + 1):
+            for cell_lon in range(low_lon, high_lon + 1):
+                found.extend(self.cells.get((cell_lat, cell_lon), ()))
+        return found
+
+
+class ForageAnalyzer:
+    """Оцінка потенційного медозбору в радіусі від точки.
+
+    Угіддя зберігаються стовпцями (координати, площа, вага = honey_yield *
+    coefficient культури), тож збір рахується одним проходом
+    sum(map(mul, ваги, площі)) по плямах у радіусі, знайдених через GridIndex.
+    """
+
+    def __init__(self, plants, layers, locations, cell_degrees=0.05):
+        self.plants = {plant.get('id'): plant for plant in plants if isinstance(plant, dict)}
+        self.lats, self.lons, self.areas, self.weights, self.plant_ids = [], [], [], [], []
+        self.skipped = 0
+        for lat, lon, plant_id, area_ha in forage_patches(layers, locations):
+            plant = self.plants.get(plant_id)
+            try:
+                lat, lon, area_ha = float(lat), float(lon), float(area_ha)
+            except (TypeError, ValueError):
+                plant = None
+            if plant is None or area_ha <= 0:
+                self.skipped += 1
+                continue
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self.areas.append(area_ha)
+            self.weights.append(float(plant.get('honey_yield') or 0) * float(plant.get('coefficient') or 0))
+            self.plant_ids.append(plant_id)
+        self.index = GridIndex(zip(self.lats, self.lons), cell_degrees)
+
+    def within(self, lat, lon, radius_km):
+        """Номери плям у радіусі та відстані до них"""
+        positions, distances = [], []
+        for position in self.index.candidates(lat, lon, radius_km):
+            distance = distance_km(lat, lon, self.lats[position], self.lons[position])
+            if distance <= radius_km:
+                positions.append(position)
+                distances.append(distance)
+        return positions, distances
+
+    def analyze(self, lat, lon, radius_km):
+        """Потенційний збір (кг), площа угідь і внесок кожної культури в радіусі"""
+        positions, distances = self.within(lat, lon, radius_km)
+        areas = [self.areas[p] for p in positions]
+        weights = [self.weights[p] for p in positions]
+        yields = list(map(mul, weights, areas))
+
+        by_plant = {}
+        for position, distance, area_ha, yield_kg in zip(positions, distances, areas, yields):
+            plant_id = self.plant_ids[position]
+            entry = by_plant.get(plant_id)
+            if entry is None:
+                entry = by_plant[plant_id] = dict(self.plants[plant_id], area_ha=0, yield_kg=0,
+                                                  nearest_km=distance)
+            entry['area_ha'] += area_ha
+            entry['yield_kg'] += yield_kg
+            entry['nearest_km'] = min(entry['nearest_km'], distance)
+
+        nearby_plants = sorted(by_plant.values(), key=lambda p: p['yield_kg'], reverse=True)
+        for plant in nearby_plants:
+            plant['area_ha'] = round(plant['area_ha'], 2)
+            plant['yield_kg'] = round(plant['yield_kg'], 2)
+            plant['nearest_km'] = round(plant['nearest_km'], 2)
+
+        return {
+            'potential_yield_kg': sum(yields),
+            'forage_area_ha': sum(areas),
+            'patches': len(positions),
+            'nearby_plants': nearby_plants
+        }
+
+
+def record_point(record, lat_field='latitude', lon_field='longitude'):
+    """Координати запису як (lat, lon) або None, якщо їх немає чи вони невірні"""
+    try:
+        lat, lon = float(record.get(lat_field)), float(record.get(lon_field))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class GeoGrid:
+    """Змінюваний просторовий індекс записів на сітці градусів: кошик -> {id: запис}.
+
+    Пошук сусідів обходить кільця кошиків навколо точки і зупиняється, щойно
+    найближчі limit записів гарантовано знайдені, тож вартість залежить від
+    щільності поблизу, а не від розміру країни.
+    """
+
+    def __init__(self, lat_field='latitude', lon_field='longitude', cell_degrees=0.1):
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def add(self, record):
+        point = record_point(record, self.lat_field, self.lon_field)
+        if point is not None:
+            self.cells.setdefault(self._cell(*point), {})[record.get('id')] = record
+
+    def remove(self, record):
+        point = record_point(record, self.lat_field, self.lon_field)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self.cells.get(cell)
+        if bucket is not None and bucket.get(record.get('id')) is record:
+            del bucket[record.get('id')]
+            if not bucket:
+                del self.cells[cell]
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        """Записи в радіусі від найближчих: [(відстань у км, запис)]"""
+        center_lat, center_lon = self._cell(lat, lon)
+        # Мінімальна ширина кошика в км (довгота стискається до полюсів)
+        cos_lat = max(0.01, math.cos(math.radians(min(89.0, abs(lat) + radius_km / KM_PER_DEGREE_MIN))))
+        cell_km = self.cell_degrees * KM_PER_DEGREE_MIN * cos_lat
+        max_ring = int(radius_km / cell_km) + 1
+        lat_rings = int(radius_km / (self.cell_degrees * KM_PER_DEGREE_MIN)) + 1
+
+        found = []
+        for ring in range(max_ring + 1):
+            for cell_lat in range(center_lat - min(ring, lat_rings), center_lat + min(ring, lat_rings) + 1):
+                on_edge = abs(cell_lat - center_lat) == ring
+                step = 1 if on_edge else 2 * ring
+                for cell_lon in range(center_lon - ring, center_lon + ring + 1, max(1, step)):
+                    for record in self.cells.get((cell_lat, cell_lon), {}).values():
+                        point = record_point(record, self.lat_field, self.lon_field)
+                        distance = distance_km(lat, lon, point[0], point[1])
+                        if distance <= radius_km:
+                            found.append((distance, record))
+            # Точки в наступних кільцях не ближчі за ring * cell_km
+            if limit and len(found) >= limit:
+                found.sort(key=lambda item: (item[0], str(item[1].get('id'))))
+                if found[limit - 1][0] <= ring * cell_km:
+                    break
+        found.sort(key=lambda item: (item[0], str(item[1].get('id'))))
+        return found[:limit] if limit else found
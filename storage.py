@@ -0,0 +1,1483 @@
+# backend/storage.py
+"""Шар зберігання даних BeePlanner"""
+import atexit
+import base64
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
+
+from spatial import KM_PER_DEGREE_MIN, GeoGrid, distance_km, record_point
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокування діє лише в межах процесу
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def copy_records(records):
+    """Поверхнева копія колекції, щоб зміни в маршрутах не зачіпали кеш"""
+    return [dict(r) if isinstance(r, dict) else r for r in records]
+
+
+def normalize_value(field, value):
+    """Приводить значення поля до вигляду, за яким ведеться пошук"""
+    if field == 'email' and isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def resolve_changes(changes, record):
+    """Зміни можна передати функцією від актуального запису (для лічильників)"""
+    return changes(record) if callable(changes) else changes
+
+
+@contextmanager
+def file_lock(filename):
+    """Ексклюзивне блокування файлу між воркерами та потоками (не реентерабельне)"""
+    with _thread_locks_guard:
+        lock = _thread_locks.setdefault(filename, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f'{filename}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class LeaderLock:
+    """Лідерство одного процесу на хості: неблокувальне блокування файлу.
+
+    Хто першим захопив файл, тримає його до завершення процесу; тоді ОС
+    знімає блокування і лідером стає наступний, хто спробує acquire().
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """True, якщо цей процес лідер (повторні виклики дешеві)"""
+        with self._lock:
+            if self._file is not None:
+                return True
+            lock_file = open(self.filename, 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+            self._file = lock_file
+            return True
+
+
+def atomic_write(filename, write):
+    """Пише у тимчасовий файл поруч і атомарно підміняє ним оригінал"""
+    tmp_name = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_name, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, filename)
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def _dump_json(data):
+    return lambda f: f.write(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+def time_key(record):
+    """Ключ хронологічного порядку для пагінації: (created_at, id)"""
+    return record.get('created_at') or '', str(record.get('id') or '')
+
+
+def encode_cursor(key):
+    """Непрозорий курсор сторінки з ключа останнього відданого запису"""
+    return base64.urlsafe_b64encode(json.dumps(list(key), ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Розбирає курсор; ValueError, якщо курсор пошкоджений"""
+    try:
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('invalid cursor')
+    return str(created_at), str(record_id)
+
+
+def _sort_records(records, order_by):
+    """Сортує записи за полем; '-created_at' означає спадання"""
+    if order_by:
+        field = order_by.lstrip('-')
+        records.sort(key=lambda r: r.get(field) or '', reverse=order_by.startswith('-'))
+    return records
+
+
+def _rank_key(value):
+    """Ключ сортування для рейтингу: числа перед рядками, порожні значення - найнижче"""
+    if value is None:
+        return -1, 0
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0, value
+    return 1, str(value)
+
+
+class GroupAggregate:
+    """Агрегати колекції в розрізі значень поля group_by, що оновлюються інкрементно.
+
+    Для кожної групи підтримуються кількість записів, суми числових полів
+    (разом з кількістю непорожніх значень - для середніх), гістограми
+    значень і відсортовані рейтинги для top-N та підрахунку «не менше ніж».
+    Зведення (rollups) ділять групу на кошики за значенням поля (наприклад,
+    за місяцем) і рахують у кожному кошику ті самі кількість, суми та гістограми.
+
+    histograms і rollups: {назва: (поле, довжина префікса або None)}, наприклад
+    ('created_at', 7) - місяць. rankings: {назва: поле}.
+    """
+
+    def __init__(self, group_by, sums=(), histograms=None, rankings=None, rollups=None):
+        self.group_by = group_by
+        self.sums = tuple(sums)
+        self.histograms = dict(histograms or {})
+        self.rankings = dict(rankings or {})
+        self.rollups = dict(rollups or {})
+        self.groups = {}
+
+    @staticmethod
+    def _value(record, field, length):
+        value = record.get(field)
+        return value[:length] if length and isinstance(value, str) else value
+
+    def _rank_entry(self, record, name):
+        return _rank_key(record.get(self.rankings[name])), time_key(record)
+
+    def _new_bucket(self):
+        return {
+            'count': 0,
+            'sums': {field: [0, 0] for field in self.sums},
+            'histograms': {name: {} for name in self.histograms}
+        }
+
+    def _bucket_apply(self, bucket, record, sign):
+        """Додає (sign=1) або віднімає (sign=-1) запис з кошика; True, якщо кошик спорожнів"""
+        bucket['count'] += sign
+        for field in self.sums:
+            value = record.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                bucket['sums'][field][0] += sign * value
+                bucket['sums'][field][1] += sign
+        for name, (field, length) in self.histograms.items():
+            histogram = bucket['histograms'][name]
+            value = self._value(record, field, length)
+            histogram[value] = histogram.get(value, 0) + sign
+            if histogram[value] <= 0:
+                del histogram[value]
+        return bucket['count'] <= 0
+
+    @staticmethod
+    def _bucket_summary(bucket):
+        return {
+            'count': bucket['count'],
+            'sums': {field: total for field, (total, _) in bucket['sums'].items()},
+            'counts': {field: count for field, (_, count) in bucket['sums'].items()},
+            'histograms': {name: dict(h) for name, h in bucket['histograms'].items()}
+        }
+
+    def add(self, record):
+        key = normalize_value(self.group_by, record.get(self.group_by))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = dict(self._new_bucket(),
+                                            rankings={name: [] for name in self.rankings},
+                                            rollups={name: {} for name in self.rollups})
+        self._bucket_apply(group, record, 1)
+        for name in self.rankings:
+            bisect.insort(group['rankings'][name], self._rank_entry(record, name))
+        for name, (field, length) in self.rollups.items():
+            buckets = group['rollups'][name]
+            value = self._value(record, field, length)
+            self._bucket_apply(buckets.setdefault(value, self._new_bucket()), record, 1)
+
+    def remove(self, record):
+        key = normalize_value(self.group_by, record.get(self.group_by))
+        group = self.groups.get(key)
+        if group is None:
+            return
+        if self._bucket_apply(group, record, -1):
+            del self.groups[key]
+            return
+        for name in self.rankings:
+            ranking = group['rankings'][name]
+            entry = self._rank_entry(record, name)
+            position = bisect.bisect_left(ranking, entry)
+            if position < len(ranking) and ranking[position] == entry:
+                del ranking[position]
+        for name, (field, length) in self.rollups.items():
+            buckets = group['rollups'][name]
+            value = self._value(record, field, length)
+            if value in buckets and self._bucket_apply(buckets[value], record, -1):
+                del buckets[value]
+
+    def summary(self, value, lookup, top=0, at_least=None, rollups=None):
+        """Підсумок групи: count, sums, counts (непорожніх значень), histograms,
+        top - до top записів кожного рейтингу від найбільшого, at_least - скільки
+        записів рейтингу мають значення не менше заданого ({рейтинг: значення}),
+        rollups - кошики зведень у межах {назва: (від, до)} включно (None - без межі).
+        lookup(id) повертає запис за id.
+        """
+        group = self.groups.get(normalize_value(self.group_by, value))
+        result = self._bucket_summary(group if group is not None else self._new_bucket())
+        result['top'] = {name: [] for name in self.rankings}
+        result['at_least'] = {name: 0 for name in (at_least or {})}
+        result['rollups'] = {name: {} for name in (rollups or {})}
+        if group is None:
+            return result
+
+        for name, ranking in group['rankings'].items():
+            entries = ranking[-top:][::-1] if top else []
+            result['top'][name] = [dict(r) for r in (lookup(entry[1][1]) for entry in entries) if r is not None]
+        for name, minimum in (at_least or {}).items():
+            ranking = group['rankings'][name]
+            result['at_least'][name] = len(ranking) - bisect.bisect_left(ranking, (_rank_key(minimum),))
+        for name, (start, end) in (rollups or {}).items():
+            selected = result['rollups'][name]
+            for key, bucket in group['rollups'][name].items():
+                if (start is not None or end is not None) and key is None:
+                    continue
+                if (start is None or key >= start) and (end is None or key <= end):
+                    selected[key] = self._bucket_summary(bucket)
+        return result
+
+
+def build_aggregates(specs, records=()):
+    """Створює GroupAggregate за описами {поле групування: параметри} і заповнює їх"""
+    aggregates = {group_by: GroupAggregate(group_by, **spec) for group_by, spec in (specs or {}).items()}
+    for record in records:
+        if isinstance(record, dict):
+            for aggregate in aggregates.values():
+                aggregate.add(record)
+    return aggregates
+
+
+def aggregate_records(records, group_by, spec, value, top=0, at_least=None, rollups=None):
+    """Разовий підрахунок агрегату групи за готовим списком записів"""
+    aggregate = GroupAggregate(group_by, **(spec or {}))
+    by_id = {}
+    for record in records:
+        aggregate.add(record)
+        by_id[record.get('id')] = record
+    return aggregate.summary(value, by_id.get, top, at_least, rollups)
+
+
+class RecordIndex:
+    """Хеш-індекси над колекцією: id -> запис та поле -> значення -> записи.
+
+    Записи в індексі не змінюються на місці - оновлення замінює запис новим
+    об'єктом. Кошики віддають записи в порядку колекції, а для пагінації
+    кошик за першого звернення отримує відсортований за time_key список,
+    який далі підтримується при кожній зміні. Разом з індексами
+    підтримуються агрегати GroupAggregate (aggregates - їхні описи) та,
+    якщо задано geo, просторовий GeoGrid.
+
+    Індекс спільний для потоків процесу, а кошики й агрегати змінюються на
+    місці, тому зміни (apply_diff, програвання журналу) і читання (bucket,
+    page, aggregate, candidates, nearby) виконуються під self.lock.
+    """
+
+    def __init__(self, fields, records=(), aggregates=None, geo=None):
+        self.lock = threading.RLock()
+        self.fields = tuple(fields)
+        self.aggregates = build_aggregates(aggregates)
+        # Просторовий індекс за полями координат (lat_field, lon_field)
+        self.geo = GeoGrid(*geo) if geo else None
+        self.by_id = {}
+        self.by_field = {field: {} for field in self.fields}
+        self._order = {}
+        self._next_order = 0
+        self._unsorted = set()
+        self._timelines = {}
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def _key(record):
+        return record.get('id') if isinstance(record, dict) else None
+
+    def _bucket_add(self, field, value, record_id, record):
+        bucket = self.by_field[field].setdefault(value, {})
+        if bucket and self._order[next(reversed(bucket))] > self._order[record_id]:
+            # Запис переїхав з іншого кошика - впорядкуємо під час читання
+            self._unsorted.add((field, value))
+        bucket[record_id] = record
+        timeline = self._timelines.get((field, value))
+        if timeline is not None:
+            bisect.insort(timeline, time_key(record))
+
+    def _bucket_remove(self, field, value, record_id):
+        bucket = self.by_field[field].get(value)
+        if bucket is not None:
+            record = bucket.pop(record_id, None)
+            timeline = self._timelines.get((field, value))
+            if timeline is not None and record is not None:
+                position = bisect.bisect_left(timeline, time_key(record))
+                if position < len(timeline) and timeline[position] == time_key(record):
+                    del timeline[position]
+            if not bucket:
+                del self.by_field[field][value]
+                self._unsorted.discard((field, value))
+                self._timelines.pop((field, value), None)
+
+    def add(self, record):
+        record_id = self._key(record)
+        if record_id is None:
+            return
+        if record_id in self.by_id:
+            self.remove(self.by_id[record_id])
+        self.by_id[record_id] = record
+        self._order[record_id] = self._next_order
+        self._next_order += 1
+        for field in self.fields:
+            self._bucket_add(field, normalize_value(field, record.get(field)), record_id, record)
+        for aggregate in self.aggregates.values():
+            aggregate.add(record)
+        if self.geo is not None:
+            self.geo.add(record)
+
+    def remove(self, record):
+        record_id = self._key(record)
+        if record_id is None or self.by_id.get(record_id) is not record:
+            return
+        del self.by_id[record_id]
+        for field in self.fields:
+            self._bucket_remove(field, normalize_value(field, record.get(field)), record_id)
+        for aggregate in self.aggregates.values():
+            aggregate.remove(record)
+        if self.geo is not None:
+            self.geo.remove(record)
+        del self._order[record_id]
+
+    def replace(self, old, new):
+        """Заміна запису зі збереженням його позиції в колекції"""
+        record_id = self._key(new)
+        if old is None or self._key(old) != record_id or self.by_id.get(record_id) is not old:
+            if old is not None:
+                self.remove(old)
+            self.add(new)
+            return
+        self.by_id[record_id] = new
+        for field in self.fields:
+            old_value = normalize_value(field, old.get(field))
+            new_value = normalize_value(field, new.get(field))
+            if old_value == new_value and time_key(old) == time_key(new):
+                self.by_field[field][old_value][record_id] = new
+            else:
+                self._bucket_remove(field, old_value, record_id)
+                self._bucket_add(field, new_value, record_id, new)
+        for aggregate in self.aggregates.values():
+            aggregate.remove(old)
+            aggregate.add(new)
+        if self.geo is not None:
+            self.geo.remove(old)
+            self.geo.add(new)
+
+    def apply_diff(self, old_records, new_records):
+        """Оновлює індекс за різницею двох версій колекції (за тотожністю об'єктів)"""
+        with self.lock:
+            old_ids = {id(r) for r in old_records}
+            new_ids = {id(r) for r in new_records}
+            added = {self._key(r): r for r in new_records if id(r) not in old_ids}
+            for record in old_records:
+                if id(record) in new_ids:
+                    continue
+                replacement = added.pop(self._key(record), None)
+                if replacement is not None:
+                    self.replace(record, replacement)
+                else:
+                    self.remove(record)
+            for record in added.values():
+                self.add(record)
+
+    def bucket(self, field, value):
+        """Записи з заданим значенням поля у порядку колекції"""
+        with self.lock:
+            value = normalize_value(field, value)
+            bucket = self.by_field[field].get(value)
+            if bucket is None:
+                return []
+            if (field, value) in self._unsorted:
+                ordered = sorted(bucket.items(), key=lambda item: self._order[item[0]])
+                bucket = self.by_field[field][value] = dict(ordered)
+                self._unsorted.discard((field, value))
+            return list(bucket.values())
+
+    def _timeline(self, field, value):
+        key = (field, value)
+        if key not in self._timelines:
+            records = self.by_field[field].get(value, {}).values()
+            self._timelines[key] = sorted(time_key(r) for r in records)
+        return self._timelines[key]
+
+    def page(self, filters, limit=None, before=None):
+        """Записи від нових до старих, строго старші за ключ before.
+
+        Повертає (записи, чи є ще) або None, якщо серед фільтрів немає
+        індексованого поля. Вартість - O(log n + розмір сторінки), поки
+        решта фільтрів рідко відсіює записи з вибраного кошика.
+        """
+        with self.lock:
+            if 'id' in filters:
+                found = [r for r in self.candidates(filters)
+                         if all(normalize_value(f, r.get(f)) == v for f, v in filters.items())
+                         and (before is None or time_key(r) < before)]
+                return found[:limit] if limit else found, bool(limit) and len(found) > limit
+
+            best = None
+            for field in self.fields:
+                if field in filters:
+                    size = len(self.by_field[field].get(filters[field], ()))
+                    if best is None or size < best[0]:
+                        best = (size, field)
+            if best is None:
+                return None
+
+            field = best[1]
+            bucket = self.by_field[field].get(filters[field], {})
+            timeline = self._timeline(field, filters[field])
+            position = bisect.bisect_left(timeline, before) if before is not None else len(timeline)
+
+            result = []
+            while position > 0:
+                position -= 1
+                record = bucket.get(timeline[position][1])
+                if record is None or not all(normalize_value(f, record.get(f)) == v for f, v in filters.items()):
+                    continue
+                if limit and len(result) == limit:
+                    return result, True
+                result.append(record)
+            return result, False
+
+    def aggregate(self, group_by, value, top=0, at_least=None, rollups=None):
+        """Підсумок агрегату за полем group_by або None, якщо такого агрегату немає"""
+        with self.lock:
+            aggregate = self.aggregates.get(group_by)
+            if aggregate is None:
+                return None
+            return aggregate.summary(value, self.by_id.get, top, at_least, rollups)
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        """Записи в радіусі від точки з просторового індексу або None, якщо його немає"""
+        if self.geo is None:
+            return None
+        with self.lock:
+            return self.geo.nearby(lat, lon, radius_km, limit)
+
+    def candidates(self, filters):
+        """Найменший набір записів, що може задовольнити фільтри, або None"""
+        with self.lock:
+            if 'id' in filters:
+                record = self.by_id.get(filters['id'])
+                return [record] if record is not None else []
+
+            best = None
+            for field in self.fields:
+                if field in filters:
+                    size = len(self.by_field[field].get(filters[field], ()))
+                    if best is None or size < best[0]:
+                        best = (size, field)
+            return self.bucket(best[1], filters[best[1]]) if best is not None else None
+
+
+class DataStore:
+    """Резидентне сховище: тримає розібрані JSON-колекції в пам'яті процесу.
+
+    Файл перечитується лише тоді, коли змінилися його mtime, розмір або inode
+    (наприклад, після запису іншим воркером gunicorn). Записувачі одного файлу
+    серіалізуються блокуванням між процесами, а файл підміняється атомарно,
+    тому читачі ніколи не бачать його недописаним і не чекають на блокування.
+
+    Для колекцій з index_fields підтримуються RecordIndex (з агрегатами
+    aggregates і просторовими індексами geo_fields): після власного запису
+    вони оновлюються інкрементно, після чужого - перебудовуються.
+    """
+
+    def __init__(self, index_fields=None, aggregates=None, geo_fields=None):
+        self.index_fields = index_fields or {}
+        self.aggregates = aggregates or {}
+        self.geo_fields = geo_fields or {}
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        # Індекси, закріплені знімками: id(RecordIndex) -> кількість знімків
+        self._pins = {}
+        self._pin_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def _signature(filename):
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _build_index(self, filename, data):
+        if filename not in self.index_fields:
+            return None
+        return RecordIndex(self.index_fields[filename], data, self.aggregates.get(filename),
+                           self.geo_fields.get(filename))
+
+    def _entry(self, filename):
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            if filename not in pinned:
+                pinned[filename] = self._pin(filename)
+            return pinned[filename]
+        return self._fresh_entry(filename)
+
+    def _pin(self, filename):
+        """Актуальна версія колекції, індекс якої записувачі не змінюватимуть на місці"""
+        while True:
+            entry = self._fresh_entry(filename)
+            if entry is None or entry[2] is None:
+                return entry
+            with self._pin_lock:
+                # Версію могли замінити між читанням і закріпленням - тоді беремо нову
+                if self._entries.get(filename) is entry:
+                    self._pins[id(entry[2])] = self._pins.get(id(entry[2]), 0) + 1
+                    return entry
+
+    def _unpin(self, entries):
+        with self._pin_lock:
+            for entry in entries:
+                if entry is not None and entry[2] is not None:
+                    key = id(entry[2])
+                    self._pins[key] -= 1
+                    if not self._pins[key]:
+                        del self._pins[key]
+
+    def _fresh_entry(self, filename):
+        try:
+            signature = self._signature(filename)
+        except OSError:
+            return None
+
+        entry = self._entries.get(filename)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Пошкоджений файл не затирає останню відому копію
+                return entry
+
+            entry = (signature, data, self._build_index(filename, data))
+            self._entries[filename] = entry
+            return entry
+
+    @contextmanager
+    def snapshot(self):
+        """Узгоджене читання кількох колекцій у поточному потоці.
+
+        Кожна колекція читається щонайбільше раз, і до кінця блоку потік бачить
+        саме цю її версію. Блокування не утримується: записувачі не чекають, а
+        замість зміни закріпленого індексу на місці будують для нової версії
+        власний (копіювання під час запису). Усередині блоку можна лише читати.
+        """
+        if getattr(self._local, 'pinned', None) is not None:
+            yield
+            return
+        self._local.pinned = {}
+        try:
+            yield
+        finally:
+            pinned, self._local.pinned = self._local.pinned, None
+            self._unpin(pinned.values())
+
+    def get(self, filename):
+        """Повертає колекцію з пам'яті, перечитуючи файл лише після змін.
+
+        Повернутий список спільний для всіх запитів - його не можна змінювати.
+        """
+        entry = self._entry(filename)
+        return entry[1] if entry is not None else []
+
+    def index(self, filename):
+        """RecordIndex актуальної версії колекції (або None)"""
+        entry = self._entry(filename)
+        if entry is None:
+            return self._build_index(filename, [])
+        return entry[2]
+
+    def _write(self, filename, data, previous=None):
+        atomic_write(filename, _dump_json(data))
+        with self._lock, self._pin_lock:
+            self.writes += 1
+            index = previous[2] if previous is not None else None
+            if index is not None and id(index) not in self._pins:
+                index.apply_diff(previous[1], data)
+            else:
+                # Попередню версію читає знімок - її індекс лишається незмінним
+                index = self._build_index(filename, data)
+            self._entries[filename] = (self._signature(filename), data, index)
+
+    def put(self, filename, data):
+        """Записує колекцію у файл і одразу оновлює її копію в пам'яті"""
+        with file_lock(filename):
+            self._write(filename, copy_records(data))
+
+    def update(self, filename, mutate):
+        """Атомарне читання-зміна-запис під блокуванням файлу.
+
+        mutate отримує свіжу поверхневу копію списку (файл перечитується, якщо
+        його встиг змінити інший воркер) і має замінювати змінені записи
+        новими словниками, а не змінювати їх на місці.
+        """
+        with file_lock(filename):
+            previous = self._entry(filename)
+            records = list(previous[1]) if previous is not None else []
+            result = mutate(records)
+            self._write(filename, records, previous)
+            return result
+
+    def stats(self):
+        """Лічильники звернень для діагностики"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+            'collections': {name: len(entry[1]) for name, entry in self._entries.items()}
+        }
+
+
+class JournalLog:
+    """Колекція у форматі append-only JSONL (журнал нотаток, сповіщення).
+
+    Кожна зміна - один рядок: insert/update з повним записом або
+    delete-надгробок. Стан відновлюється програванням журналу, а коли файл
+    переростає поріг, він ущільнюється у фоновому потоці.
+    """
+
+    def __init__(self, filename, seed_records=None, compact_threshold=1024 * 1024, index_fields=(),
+                 aggregates=None):
+        self.filename = filename
+        self.compact_threshold = compact_threshold
+        self.index_fields = index_fields
+        self.aggregates = aggregates
+        self._records = {}
+        self._index = RecordIndex(index_fields, aggregates=aggregates)
+        self._offset = 0
+        self._inode = None
+        self._file = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pinned = 0
+        self._compacting = False
+        self._compacted_size = 0
+        self.appends = 0
+        self.compactions = 0
+
+        if not os.path.exists(filename):
+            self._write_snapshot(seed_records or [])
+        self._sync()
+
+    def _write_snapshot(self, records):
+        """Атомарно замінює журнал знімком живих записів"""
+        def write(f):
+            for record in records:
+                f.write(self._encode('insert', record))
+
+        with file_lock(self.filename):
+            if not os.path.exists(self.filename):
+                atomic_write(self.filename, write)
+
+    @staticmethod
+    def _encode(op, record):
+        entry = {'op': op, 'id': record['id']}
+        if op != 'delete':
+            entry['record'] = record
+        return (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _apply(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return
+        old = self._records.get(entry.get('id'))
+        if entry.get('op') == 'delete':
+            if old is not None:
+                del self._records[entry['id']]
+                self._index.remove(old)
+        elif entry.get('record') is not None:
+            self._records[entry['id']] = entry['record']
+            self._index.replace(old, entry['record'])
+
+    def _sync(self):
+        """Дочитує нові рядки журналу (зокрема дописані іншими воркерами)"""
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return
+
+        if self._file is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Журнал ущільнили або замінили - програємо його з початку.
+            # Відкритий дескриптор не дає ОС повторно видати той самий inode.
+            self._reopen()
+            self._records = {}
+            self._index = RecordIndex(self.index_fields, aggregates=self.aggregates)
+            self._offset = 0
+
+        self._file.seek(self._offset)
+        chunk = self._file.read()
+
+        # Незавершений останній рядок дочитаємо наступного разу
+        end = chunk.rfind(b'\n') + 1
+        if end and self._pinned:
+            # Поточний стан читають знімки - нові рядки застосовуємо до копії
+            self._records = dict(self._records)
+            self._index = RecordIndex(self.index_fields, self._records.values(), aggregates=self.aggregates)
+        with self._index.lock:
+            for line in chunk[:end].splitlines():
+                if line.strip():
+                    self._apply(line)
+        self._offset += end
+
+    def _reopen(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.filename, 'rb')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _state(self):
+        """Записи та індекс: закріплені знімком поточного потоку або актуальні"""
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            return pinned
+        with self._lock:
+            self._sync()
+            return self._records, self._index
+
+    def all(self):
+        """Поточні записи у порядку додавання (список не можна змінювати)"""
+        return list(self._state()[0].values())
+
+    def index(self):
+        """RecordIndex поточного стану журналу"""
+        return self._state()[1]
+
+    @contextmanager
+    def snapshot(self):
+        """Поки триває блок, потік бачить незмінний стан журналу (див. DataStore.snapshot)"""
+        if getattr(self._local, 'pinned', None) is not None:
+            yield
+            return
+        with self._lock:
+            self._sync()
+            self._local.pinned = (self._records, self._index)
+            self._pinned += 1
+        try:
+            yield
+        finally:
+            self._local.pinned = None
+            with self._lock:
+                self._pinned -= 1
+
+    def _append(self, op, records):
+        """Дописує зміни кількох записів одним записом у файл"""
+        data = b''.join(self._encode(op, record) for record in records)
+        if not data:
+            return
+        with self._lock, file_lock(self.filename):
+            with open(self.filename, 'ab') as f:
+                f.write(data)
+            self.appends += 1
+            self._sync()
+            size = self._offset
+        if size > self.compact_threshold and size > 2 * self._compacted_size:
+            self.compact_async()
+
+    def insert(self, record):
+        self._append('insert', [dict(record)])
+
+    def insert_many(self, records):
+        self._append('insert', [dict(r) for r in records])
+
+    def update(self, record):
+        self._append('update', [dict(record)])
+
+    def update_many(self, records):
+        self._append('update', [dict(r) for r in records])
+
+    def delete(self, record_id):
+        self._append('delete', [{'id': record_id}])
+
+    def delete_many(self, record_ids):
+        self._append('delete', [{'id': record_id} for record_id in record_ids])
+
+    def compact(self):
+        """Переписує журнал, залишаючи лише живі записи"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            self._sync()
+            snapshot = list(self._records.values())
+            snapshot_offset = self._offset
+            # Власний дескриптор тримає inode знімка, поки триває ущільнення
+            source = os.fdopen(os.dup(self._file.fileno()), 'rb')
+        tmp_name = f'{self.filename}.{os.getpid()}.compact'
+        try:
+            with open(tmp_name, 'wb') as f:
+                for record in snapshot:
+                    f.write(self._encode('insert', record))
+            with self._lock, file_lock(self.filename):
+                if os.stat(self.filename).st_ino != os.fstat(source.fileno()).st_ino:
+                    # Журнал уже ущільнив інший воркер
+                    return
+                # Рядки, дописані під час ущільнення (зокрема іншими воркерами),
+                # переносимо як є
+                self._sync()
+                source.seek(snapshot_offset)
+                tail = source.read(self._offset - snapshot_offset)
+                with open(tmp_name, 'ab') as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_name, self.filename)
+                self._reopen()
+                self._offset = os.fstat(self._file.fileno()).st_size
+                self._compacted_size = self._offset
+                self.compactions += 1
+        finally:
+            source.close()
+            self._compacting = False
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def compact_async(self):
+        """Запускає ущільнення у фоновому потоці"""
+        if not self._compacting:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def stats(self):
+        return {
+            'records': len(self._records),
+            'log_bytes': self._offset,
+            'appends': self.appends,
+            'compactions': self.compactions
+        }
+
+
+class DeferredUpdates:
+    """Буфер дрібних змін записів (час входу тощо), які не варті окремого запису файлу.
+
+    Зміни одного запису зливаються, а раз на interval секунд і під час
+    завершення процесу всі накопичені зміни записуються одним update_many
+    на колекцію.
+    """
+
+    def __init__(self, backend, interval=30):
+        self.backend = backend
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.buffered = 0
+        self.flushes = 0
+        self.flushed_records = 0
+
+    def set(self, filename, record_id, changes):
+        with self._lock:
+            self._pending.setdefault(filename, {}).setdefault(record_id, {}).update(changes)
+            self.buffered += 1
+        self.start()
+
+    def pending(self, filename, record_id):
+        """Ще не записані зміни запису (для накладання при читанні)"""
+        with self._lock:
+            return dict(self._pending.get(filename, {}).get(record_id, {}))
+
+    def flush(self):
+        """Записує всі накопичені зміни: один запис файлу на колекцію"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for filename, batch in pending.items():
+            try:
+                updated = self.backend.update_many(filename, batch.keys(), lambda r: batch[r['id']])
+                self.flushed_records += len(updated)
+            except Exception as e:
+                print(f"⚠️ Не вдалося записати відкладені зміни {filename}: {e}")
+                with self._lock:
+                    # Повертаємо в буфер, не затираючи новіших змін
+                    current = self._pending.setdefault(filename, {})
+                    for record_id, changes in batch.items():
+                        current[record_id] = dict(changes, **current.get(record_id, {}))
+        self.flushes += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        """Запускає фоновий потік скидання (повторні виклики нічого не роблять)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='deferred-updates', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        return {
+            'pending_records': sum(len(batch) for batch in self._pending.values()),
+            'buffered': self.buffered,
+            'flushes': self.flushes,
+            'flushed_records': self.flushed_records,
+            'interval': self.interval
+        }
+
+
+class JsonBackend:
+    """Зберігання колекцій у JSON-файлах (режим розробки).
+
+    Окремі колекції (журнал нотаток, сповіщення) за потреби ведуться в
+    append-only JournalLog: logs = {ім'я файлу: JournalLog}.
+    """
+
+    name = 'json'
+
+    def __init__(self, data_store, logs=None):
+        self.data_store = data_store
+        self.logs = dict(logs or {})
+
+    def _records(self, filename):
+        log = self.logs.get(filename)
+        if log is not None:
+            return log.all()
+        return self.data_store.get(filename)
+
+    def _index(self, filename):
+        log = self.logs.get(filename)
+        if log is not None:
+            return log.index()
+        return self.data_store.index(filename)
+
+    def _candidates(self, filename, filters):
+        """Записи-кандидати з хеш-індексу, а без придатного індексу - вся колекція"""
+        index = self._index(filename)
+        candidates = index.candidates(filters) if index is not None else None
+        return candidates if candidates is not None else self._records(filename)
+
+    def _rewrite(self, filename, mutate):
+        """Читає-змінює-записує весь файл колекції під блокуванням"""
+        return self.data_store.update(filename, mutate)
+
+    @contextmanager
+    def snapshot(self):
+        """Узгоджене читання кількох колекцій (див. DataStore.snapshot)"""
+        with self.data_store.snapshot(), ExitStack() as stack:
+            for log in self.logs.values():
+                stack.enter_context(log.snapshot())
+            yield
+
+    def all(self, filename):
+        return copy_records(self._records(filename))
+
+    def find(self, filename, order_by=None, **filters):
+        filters = {field: normalize_value(field, value) for field, value in filters.items()}
+        result = [dict(r) for r in self._candidates(filename, filters)
+                  if all(normalize_value(f, r.get(f)) == v for f, v in filters.items())]
+        return _sort_records(result, order_by)
+
+    def find_one(self, filename, **filters):
+        found = self.find(filename, **filters)
+        return found[0] if found else None
+
+    def find_page(self, filename, limit=None, cursor=None, **filters):
+        """Сторінка записів від нових до старих: (записи, next_cursor)"""
+        filters = {field: normalize_value(field, value) for field, value in filters.items()}
+        before = decode_cursor(cursor) if cursor else None
+        index = self._index(filename)
+        page = index.page(filters, limit, before) if index is not None else None
+
+        if page is None:
+            # Без придатного індексу - повне сортування
+            found = sorted((r for r in self._records(filename)
+                            if all(normalize_value(f, r.get(f)) == v for f, v in filters.items())
+                            and (before is None or time_key(r) < before)),
+                           key=time_key, reverse=True)
+            page = (found[:limit], len(found) > limit) if limit else (found, False)
+
+        records, has_more = page
+        next_cursor = encode_cursor(time_key(records[-1])) if has_more else None
+        return [dict(r) for r in records], next_cursor
+
+    def get(self, filename, record_id):
+        return self.find_one(filename, id=record_id)
+
+    def count(self, filename, **filters):
+        return len(self.find(filename, **filters))
+
+    def aggregate(self, filename, group_by, value, top=0, at_least=None, rollups=None):
+        """Підсумок групи записів (див. GroupAggregate.summary) з агрегату в пам'яті"""
+        index = self._index(filename)
+        result = index.aggregate(group_by, value, top, at_least, rollups) if index is not None else None
+        if result is None:
+            spec = self.data_store.aggregates.get(filename, {}).get(group_by)
+            result = aggregate_records(self.find(filename, **{group_by: value}), group_by, spec,
+                                       value, top, at_least, rollups)
+        return result
+
+    def nearby(self, filename, lat, lon, radius_km, limit=None, **filters):
+        """Записи в радіусі від точки, від найближчих: [(відстань у км, запис)]"""
+        filters = {field: normalize_value(field, value) for field, value in filters.items()}
+        index = self._index(filename)
+        found = index.nearby(lat, lon, radius_km, None if filters else limit) if index is not None else None
+        if found is None:
+            grid = GeoGrid(*self.data_store.geo_fields.get(filename, ('latitude', 'longitude')))
+            for record in self._records(filename):
+                grid.add(record)
+            found = grid.nearby(lat, lon, radius_km, None if filters else limit)
+
+        if not filters:
+            return [(distance, dict(r)) for distance, r in found]
+        found = [(distance, dict(r)) for distance, r in found
+                 if all(normalize_value(f, r.get(f)) == v for f, v in filters.items())]
+        return found[:limit] if limit else found
+
+    def insert(self, filename, record):
+        if filename in self.logs:
+            self.logs[filename].insert(record)
+        else:
+            self._rewrite(filename, lambda records: records.append(dict(record)))
+        return record
+
+    def insert_many(self, filename, new_records):
+        if filename in self.logs:
+            self.logs[filename].insert_many(new_records)
+        else:
+            self._rewrite(filename, lambda records: records.extend(dict(r) for r in new_records))
+        return new_records
+
+    def insert_unique(self, filename, record, field):
+        """Додає запис, лише якщо в колекції немає іншого з тим самим значенням field.
+
+        Перевірка й запис відбуваються під одним блокуванням файлу, тому два
+        воркери не можуть одночасно додати дублікати. Повертає запис або None.
+        """
+        value = normalize_value(field, record.get(field))
+        if filename in self.logs:
+            if self.find_one(filename, **{field: value}):
+                return None
+            return self.insert(filename, record)
+
+        def mutate(records):
+            # Під блокуванням колекція вже перечитана, тож індекс відповідає records
+            index = self.data_store.index(filename)
+            candidates = index.candidates({field: value}) if index is not None else None
+            if candidates is None:
+                candidates = records
+            if any(normalize_value(field, r.get(field)) == value for r in candidates):
+                return None
+            records.append(dict(record))
+            return record
+
+        return self._rewrite(filename, mutate)
+
+    def insert_missing(self, filename, new_records):
+        """Додає одним записом лише ті записи, id яких ще немає в колекції; повертає додані"""
+        by_id = self._index(filename).by_id
+        if all(r['id'] in by_id for r in new_records):
+            return []
+        if filename in self.logs:
+            fresh = [r for r in new_records if r['id'] not in by_id]
+            self.logs[filename].insert_many(fresh)
+            return fresh
+
+        def mutate(records):
+            # Під блокуванням індекс відповідає щойно перечитаній колекції
+            existing = self.data_store.index(filename).by_id
+            fresh = [dict(r) for r in new_records if r['id'] not in existing]
+            records.extend(fresh)
+            return fresh
+
+        return self._rewrite(filename, mutate)
+
+    def update_many(self, filename, record_ids, changes):
+        """Застосовує зміни до кількох записів одним записом файлу.
+
+        changes - словник або функція від актуального запису, що повертає словник.
+        """
+        record_ids = set(record_ids)
+        if not record_ids:
+            return []
+
+        if filename in self.logs:
+            updated = []
+            by_id = self._index(filename).by_id
+            for record_id in record_ids:
+                record = by_id.get(record_id)
+                if record is not None:
+                    updated.append(dict(record, **resolve_changes(changes, record)))
+            self.logs[filename].update_many(updated)
+            return updated
+
+        def mutate(records):
+            updated = []
+            for i, record in enumerate(records):
+                if isinstance(record, dict) and record.get('id') in record_ids:
+                    # Записи в сховищі не змінюються на місці - замінюємо новим
+                    records[i] = dict(record, **resolve_changes(changes, record))
+                    updated.append(dict(records[i]))
+            return updated
+
+        return self._rewrite(filename, mutate)
+
+    def update(self, filename, record_id, changes):
+        updated = self.update_many(filename, [record_id], changes)
+        return updated[0] if updated else None
+
+    def delete_where(self, filename, **filters):
+        doomed = self.find(filename, **filters)
+        doomed_ids = {r.get('id') for r in doomed}
+        if not doomed_ids:
+            return []
+
+        if filename in self.logs:
+            self.logs[filename].delete_many(doomed_ids)
+            return doomed
+
+        def mutate(records):
+            records[:] = [r for r in records if not (isinstance(r, dict) and r.get('id') in doomed_ids)]
+
+        self._rewrite(filename, mutate)
+        return doomed
+
+    def delete(self, filename, record_id):
+        deleted = self.delete_where(filename, id=record_id)
+        return deleted[0] if deleted else None
+
+
+class SqliteBackend:
+    """Зберігання основних колекцій у локальній базі SQLite.
+
+    tables: {ім'я файлу: (таблиця, [індекси як кортежі колонок])}. Запис
+    зберігається цілим JSON у колонці data, а поля з індексів винесені в
+    окремі колонки. Колекції поза tables обслуговує fallback-бекенд.
+    Агрегати (aggregates) рахуються за індексованою вибіркою групи, а для
+    колекцій з geo_fields є індекс за широтою для пошуку в радіусі.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, tables, fallback=None, aggregates=None, geo_fields=None):
+        self.path = path
+        self.fallback = fallback
+        self.aggregates = aggregates or {}
+        self.geo_fields = geo_fields or {}
+        self.tables = {}
+        for filename, (table, indexes) in tables.items():
+            columns = []
+            for index in indexes:
+                for column in index:
+                    if column not in ('id', 'created_at') and column not in columns:
+                        columns.append(column)
+            self.tables[filename] = (table, columns, indexes)
+        self._local = threading.local()
+        self._create_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        return _SqliteTransaction(conn)
+
+    def _create_schema(self):
+        with self._transaction() as conn:
+            for table, columns, indexes in self.tables.values():
+                extra = ''.join(f', {column} TEXT' for column in columns)
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                             f'(id TEXT PRIMARY KEY{extra}, created_at TEXT, data TEXT NOT NULL)')
+                for index in indexes:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{"_".join(index)} '
+                                 f'ON {table} ({", ".join(index)})')
+            for filename, (lat_field, _) in self.geo_fields.items():
+                if filename in self.tables:
+                    table = self.tables[filename][0]
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_geo '
+                                 f'ON {table} ({self._geo_expression(lat_field)})')
+
+    def _row(self, columns, record):
+        values = [record['id']]
+        values += [normalize_value(column, record.get(column)) for column in columns]
+        values += [record.get('created_at'), json.dumps(record, ensure_ascii=False)]
+        return values
+
+    def _where(self, filename, filters):
+        table, columns, _ = self.tables[filename]
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field in ('id', 'created_at') or field in columns:
+                clauses.append(f'{field} IS ?')
+            else:
+                clauses.append(f"json_extract(data, '$.{field}') IS ?")
+            params.append(normalize_value(field, value))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _select(self, conn, filename, filters, order_by=None):
+        table = self.tables[filename][0]
+        where, params = self._where(filename, filters)
+        order = 'rowid'
+        if order_by:
+            order = f'{order_by.lstrip("-")} {"DESC" if order_by.startswith("-") else "ASC"}, rowid'
+        rows = conn.execute(f'SELECT data FROM {table}{where} ORDER BY {order}', params)
+        return [json.loads(row[0]) for row in rows]
+
+    @contextmanager
+    def snapshot(self):
+        """Читання в одній транзакції: усі запити бачать той самий стан бази"""
+        conn = self._connect()
+        with self.fallback.snapshot():
+            if conn.in_transaction:
+                yield
+                return
+            conn.execute('BEGIN')
+            try:
+                yield
+            finally:
+                conn.execute('COMMIT')
+
+    def all(self, filename):
+        if filename not in self.tables:
+            return self.fallback.all(filename)
+        return self._select(self._connect(), filename, {})
+
+    def find(self, filename, order_by=None, **filters):
+        if filename not in self.tables:
+            return self.fallback.find(filename, order_by=order_by, **filters)
+        return self._select(self._connect(), filename, filters, order_by)
+
+    def find_one(self, filename, **filters):
+        found = self.find(filename, **filters)
+        return found[0] if found else None
+
+    def find_page(self, filename, limit=None, cursor=None, **filters):
+        """Сторінка записів від нових до старих: (записи, next_cursor).
+
+        Використовує складені індекси (поле, created_at) без сортування в пам'яті.
+        """
+        if filename not in self.tables:
+            return self.fallback.find_page(filename, limit=limit, cursor=cursor, **filters)
+        table = self.tables[filename][0]
+        where, params = self._where(filename, filters)
+        if cursor:
+            created_at, record_id = decode_cursor(cursor)
+            where += (' AND ' if where else ' WHERE ') + '(created_at, id) < (?, ?)'
+            params += [created_at, record_id]
+        sql = f'SELECT data FROM {table}{where} ORDER BY created_at DESC, id DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+        records = [json.loads(row[0]) for row in self._connect().execute(sql, params)]
+
+        next_cursor = None
+        if limit and len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(time_key(records[-1]))
+        return records, next_cursor
+
+    def get(self, filename, record_id):
+        return self.find_one(filename, id=record_id)
+
+    def count(self, filename, **filters):
+        if filename not in self.tables:
+            return self.fallback.count(filename, **filters)
+        where, params = self._where(filename, filters)
+        table = self.tables[filename][0]
+        return self._connect().execute(f'SELECT COUNT(*) FROM {table}{where}', params).fetchone()[0]
+
+    def _insert_rows(self, conn, filename, new_records, replace=False):
+        table, columns, _ = self.tables[filename]
+        placeholders = ', '.join('?' * (len(columns) + 3))
+        names = ', '.join(['id'] + columns + ['created_at', 'data'])
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+        conn.executemany(f'{verb} INTO {table} ({names}) VALUES ({placeholders})',
+                         [self._row(columns, r) for r in new_records])
+
+    @staticmethod
+    def _geo_expression(field):
+        return f"CAST(json_extract(data, '$.{field}') AS REAL)"
+
+    def nearby(self, filename, lat, lon, radius_km, limit=None, **filters):
+        if filename not in self.tables or filename not in self.geo_fields:
+            return self.fallback.nearby(filename, lat, lon, radius_km, limit, **filters)
+        table = self.tables[filename][0]
+        lat_field, lon_field = self.geo_fields[filename]
+        where, params = self._where(filename, filters)
+        # Смуга широт вибирається за індексом, довгота відсікається там же, решта - точною відстанню
+        d_lat = radius_km / KM_PER_DEGREE_MIN
+        d_lon = d_lat / max(0.01, math.cos(math.radians(min(89.0, abs(lat) + d_lat))))
+        clause = (f'{self._geo_expression(lat_field)} BETWEEN ? AND ? '
+                  f'AND {self._geo_expression(lon_field)} BETWEEN ? AND ?')
+        where = f'{where} AND {clause}' if where else f' WHERE {clause}'
+        rows = self._connect().execute(f'SELECT data FROM {table}{where}',
+                                       params + [lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon])
+
+        found = []
+        for row in rows:
+            record = json.loads(row[0])
+            point = record_point(record, lat_field, lon_field)
+            if point is not None:
+                distance = distance_km(lat, lon, point[0], point[1])
+                if distance <= radius_km:
+                    found.append((distance, record))
+        found.sort(key=lambda item: (item[0], str(item[1].get('id'))))
+        return found[:limit] if limit else found
+
+    def aggregate(self, filename, group_by, value, top=0, at_least=None, rollups=None):
+        if filename not in self.tables:
+            return self.fallback.aggregate(filename, group_by, value, top, at_least, rollups)
+        spec = self.aggregates.get(filename, {}).get(group_by)
+        records = self._select(self._connect(), filename, {group_by: value})
+        return aggregate_records(records, group_by, spec, value, top, at_least, rollups)
+
+    def insert_many(self, filename, new_records, replace=False):
+        if filename not in self.tables:
+            return self.fallback.insert_many(filename, new_records)
+        with self._transaction() as conn:
+            self._insert_rows(conn, filename, new_records, replace)
+        return new_records
+
+    def insert(self, filename, record):
+        self.insert_many(filename, [record])
+        return record
+
+    def insert_unique(self, filename, record, field):
+        """Додає запис, якщо немає іншого з тим самим значенням field (або повертає None).
+
+        BEGIN IMMEDIATE тримає блокування запису між перевіркою та вставкою.
+        """
+        if filename not in self.tables:
+            return self.fallback.insert_unique(filename, record, field)
+        with self._transaction() as conn:
+            if self._select(conn, filename, {field: record.get(field)}):
+                return None
+            self._insert_rows(conn, filename, [record])
+        return record
+
+    def insert_missing(self, filename, new_records):
+        """Додає лише записи, id яких ще немає в таблиці; повертає додані"""
+        if filename not in self.tables:
+            return self.fallback.insert_missing(filename, new_records)
+        table = self.tables[filename][0]
+        with self._transaction() as conn:
+            existing = set()
+            ids = [r['id'] for r in new_records]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = conn.execute(f'SELECT id FROM {table} WHERE id IN ({", ".join("?" * len(chunk))})', chunk)
+                existing.update(row[0] for row in rows)
+            fresh = [r for r in new_records if r['id'] not in existing]
+            self._insert_rows(conn, filename, fresh)
+        return fresh
+
+    def update_many(self, filename, record_ids, changes):
+        if filename not in self.tables:
+            return self.fallback.update_many(filename, record_ids, changes)
+        table, columns, _ = self.tables[filename]
+        assignments = ', '.join(f'{column} = ?' for column in columns + ['created_at', 'data'])
+        updated = []
+        with self._transaction() as conn:
+            for record_id in set(record_ids):
+                found = self._select(conn, filename, {'id': record_id})
+                if not found:
+                    continue
+                record = found[0]
+                record.update(resolve_changes(changes, record))
+                conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?',
+                             self._row(columns, record)[1:] + [record_id])
+                updated.append(record)
+        return updated
+
+    def update(self, filename, record_id, changes):
+        updated = self.update_many(filename, [record_id], changes)
+        return updated[0] if updated else None
+
+    def delete_where(self, filename, **filters):
+        if filename not in self.tables:
+            return self.fallback.delete_where(filename, **filters)
+        table = self.tables[filename][0]
+        where, params = self._where(filename, filters)
+        with self._transaction() as conn:
+            doomed = self._select(conn, filename, filters)
+            conn.execute(f'DELETE FROM {table}{where}', params)
+        return doomed
+
+    def delete(self, filename, record_id):
+        deleted = self.delete_where(filename, id=record_id)
+        return deleted[0] if deleted else None
+
+    def import_records(self, filename, records):
+        """Одноразовий імпорт колекції; записи без id пропускаються"""
+        records = [r for r in records if isinstance(r, dict) and r.get('id')]
+        self.insert_many(filename, records, replace=True)
+        return len(records)
+
+
+class _SqliteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, щоб читання-зміна-запис не губили оновлень"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
@@ -0,0 +1,209 @@
+# backend/test_storage.py
+"""Інваріанти шару зберігання: записи кількох процесів, програвання журналу, агрегати"""
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from storage import DataStore, JournalLog, JsonBackend, aggregate_records
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+AGGREGATE_SPEC = {
+    'sums': ('temperature', 'hives_affected'),
+    'histograms': {'work_type': ('work_type', None)},
+    'rankings': {'created_at': 'created_at'},
+    'rollups': {'month': ('created_at', 7), 'work_type': ('work_type', None)}
+}
+
+# Кожен процес додає 40 записів і 40 разів збільшує спільний лічильник
+JSON_WRITER = """
+import sys
+from storage import DataStore, JsonBackend
+filename, worker = sys.argv[1], sys.argv[2]
+db = JsonBackend(DataStore({filename: ('user_id',)}))
+for i in range(40):
+    db.insert(filename, {'id': f'{worker}-{i}', 'user_id': worker, 'created_at': ''})
+    db.update(filename, 'counter', lambda r: {'n': r['n'] + 1})
+"""
+
+LOG_WRITER = """
+import sys
+from storage import JournalLog
+filename, worker = sys.argv[1], sys.argv[2]
+log = JournalLog(filename, compact_threshold=2048)
+for i in range(40):
+    log.insert({'id': f'{worker}-{i}', 'user_id': worker})
+    if i % 4 == 0:
+        log.update({'id': f'{worker}-{i}', 'user_id': worker, 'edited': True})
+    if i % 10 == 0:
+        log.compact()
+"""
+
+
+def run_writers(code, filename, workers=4):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    processes = [subprocess.Popen([sys.executable, '-c', code, filename, f'w{n}'], cwd=ROOT, env=env)
+                 for n in range(workers)]
+    assert [p.wait(timeout=120) for p in processes] == [0] * workers
+
+
+def test_json_writes_from_several_processes_are_not_lost(tmp_path):
+    filename = str(tmp_path / 'apiaries.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump([{'id': 'counter', 'n': 0, 'created_at': ''}], f)
+
+    run_writers(JSON_WRITER, filename)
+
+    with open(filename, encoding='utf-8') as f:
+        records = json.load(f)
+    by_id = {r['id']: r for r in records}
+    assert len(records) == len(by_id) == 161
+    assert by_id['counter']['n'] == 160
+
+
+def test_journal_appends_from_several_processes_survive_compaction(tmp_path):
+    filename = str(tmp_path / 'journal.jsonl')
+
+    run_writers(LOG_WRITER, filename)
+
+    records = JournalLog(filename).all()
+    assert len(records) == 160
+    assert sum(1 for r in records if r.get('edited')) == 40
+
+
+def test_journal_replays_to_the_same_state_after_compaction(tmp_path):
+    filename = str(tmp_path / 'journal.jsonl')
+    writer = JournalLog(filename, compact_threshold=10 ** 9)
+    reader = JournalLog(filename, compact_threshold=10 ** 9)
+
+    writer.insert_many([{'id': str(i), 'value': i} for i in range(50)])
+    writer.update_many([{'id': str(i), 'value': -i} for i in range(0, 50, 3)])
+    writer.delete_many([str(i) for i in range(0, 50, 5)])
+    expected = writer.all()
+    assert reader.all() == expected
+
+    writer.compact()
+    assert writer.compactions == 1
+    assert writer.all() == expected
+    # Інший екземпляр (воркер) тримав старий inode - він перечитує ущільнений журнал
+    assert reader.all() == expected
+    assert JournalLog(filename).all() == expected
+
+    # Зміни після ущільнення бачать усі
+    reader.insert({'id': 'late', 'value': 1})
+    reader.delete('1')
+    assert writer.all() == reader.all() == JournalLog(filename).all()
+    assert [r['id'] for r in writer.all()][-1] == 'late'
+
+
+def test_journal_keeps_lines_appended_while_compacting(tmp_path):
+    filename = str(tmp_path / 'journal.jsonl')
+    compactor = JournalLog(filename, compact_threshold=10 ** 9)
+    other = JournalLog(filename, compact_threshold=10 ** 9)
+    compactor.insert_many([{'id': str(i)} for i in range(10)])
+
+    encode = JournalLog._encode
+    appended = []
+
+    def encode_and_append(op, record):
+        # Поки пишеться знімок, інший воркер дописує журнал
+        if not appended:
+            appended.append(True)
+            other.insert({'id': 'during'})
+            other.delete('3')
+        return encode(op, record)
+
+    compactor._encode = encode_and_append
+    compactor.compact()
+    del compactor._encode
+
+    expected = [str(i) for i in range(10) if i != 3] + ['during']
+    assert [r['id'] for r in compactor.all()] == expected
+    assert [r['id'] for r in other.all()] == expected
+    assert [r['id'] for r in JournalLog(filename).all()] == expected
+
+
+@pytest.mark.parametrize('storage', ['json', 'jsonl'])
+def test_snapshot_does_not_block_writers_and_keeps_its_version(tmp_path, storage):
+    filename = str(tmp_path / 'apiaries.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump([{'id': '1', 'user_id': 'u1'}], f)
+    logs = {}
+    if storage == 'jsonl':
+        logs[filename] = JournalLog(str(tmp_path / 'apiaries.jsonl'), seed_records=[{'id': '1', 'user_id': 'u1'}],
+                                    index_fields=('user_id',))
+    db = JsonBackend(DataStore({filename: ('user_id',)}), logs)
+
+    with db.snapshot():
+        assert [r['id'] for r in db.find(filename, user_id='u1')] == ['1']
+        # Запис з іншого потоку завершується, поки знімок відкритий
+        writer = threading.Thread(target=db.insert, args=(filename, {'id': '2', 'user_id': 'u1'}))
+        writer.start()
+        writer.join(timeout=10)
+        assert not writer.is_alive()
+        assert [r['id'] for r in db.find(filename, user_id='u1')] == ['1']
+        assert len(db.all(filename)) == 1
+
+    assert [r['id'] for r in db.find(filename, user_id='u1')] == ['1', '2']
+    # Після знімка індекс знову оновлюється на місці
+    db.update(filename, '1', {'user_id': 'u2'})
+    assert [r['id'] for r in db.find(filename, user_id='u1')] == ['2']
+    assert [r['id'] for r in db.find(filename, user_id='u2')] == ['1']
+
+
+@pytest.mark.parametrize('storage', ['json', 'jsonl'])
+def test_incremental_aggregates_match_full_recompute(tmp_path, storage):
+    filename = str(tmp_path / 'journal.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump([], f)
+    data_store = DataStore(index_fields={filename: ('apiary_id',)},
+                           aggregates={filename: {'apiary_id': AGGREGATE_SPEC}})
+    logs = {}
+    if storage == 'jsonl':
+        logs[filename] = JournalLog(str(tmp_path / 'journal.jsonl'), index_fields=('apiary_id',),
+                                    aggregates={'apiary_id': AGGREGATE_SPEC})
+    db = JsonBackend(data_store, logs)
+
+    rng = random.Random(7)
+    apiaries = ['a1', 'a2', 'a3']
+    live = []
+
+    def random_fields():
+        return {
+            'apiary_id': rng.choice(apiaries),
+            'work_type': rng.choice(['inspection', 'feeding', 'treatment', None]),
+            'temperature': rng.choice([rng.randint(-5, 30), None]),
+            'hives_affected': rng.randint(0, 12),
+            'created_at': f'2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00'
+        }
+
+    for step in range(300):
+        action = rng.random()
+        if action < 0.5 or not live:
+            record = dict(random_fields(), id=f'r{step}')
+            db.insert(filename, record)
+            live.append(record['id'])
+        elif action < 0.8:
+            db.update(filename, rng.choice(live), random_fields())
+        elif action < 0.9:
+            db.update_many(filename, rng.sample(live, min(5, len(live))),
+                           lambda r: {'hives_affected': r['hives_affected'] + 1})
+        else:
+            db.delete(filename, live.pop(rng.randrange(len(live))))
+
+    query = {
+        'top': 3,
+        'at_least': {'created_at': '2026-06'},
+        'rollups': {'month': ('2026-03', '2026-09'), 'work_type': (None, None)}
+    }
+    for apiary_id in apiaries:
+        incremental = db.aggregate(filename, 'apiary_id', apiary_id, **query)
+        recomputed = aggregate_records(db.find(filename, apiary_id=apiary_id), 'apiary_id', AGGREGATE_SPEC,
+                                       apiary_id, **query)
+        assert incremental == recomputed
+        assert incremental['count'] == db.count(filename, apiary_id=apiary_id)
@@ -0,0 +1,520 @@
+# backend/weather.py
+"""Кешування та клієнт погодних даних OpenWeatherMap"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def weather_cell(lat, lon, grid):
+    """Округлює координати до сітки, щоб сусідні пасіки ділили один запис кешу"""
+    return round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4)
+
+
+def create_http_session(pool_size=10):
+    """Спільна сесія з пулом keep-alive з'єднань, щоб не відкривати TCP+TLS на кожен запит"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def bee_activity_level(temp_day, condition):
+    """Активність бджіл і кількість льотних годин за денною температурою та станом погоди"""
+    if 15 <= temp_day <= 28 and 'Rain' not in condition:
+        return 'висока', 10
+    if 10 <= temp_day <= 30:
+        return 'середня', 7
+    return 'низька', 4
+
+
+def daily_forecast(forecast_data, days=3):
+    """Прогноз OpenWeatherMap (кроки по 3 години) як підсумки наступних days днів без сьогоднішнього"""
+    daily_forecasts = {}
+
+    # Групуємо прогнози по днях
+    for item in (forecast_data or {}).get('list') or []:
+        daily_forecasts.setdefault(date.fromtimestamp(item['dt']).isoformat(), []).append(item)
+
+    # Видаляємо сьогоднішній день
+    daily_forecasts.pop(date.today().isoformat(), None)
+
+    forecast = []
+    for day in sorted(daily_forecasts)[:days]:
+        day_forecasts = daily_forecasts[day]
+
+        # Знаходимо макс/мін температури
+        temps = [f['main']['temp'] for f in day_forecasts]
+        humidities = [f['main']['humidity'] for f in day_forecasts]
+        winds = [f['wind']['speed'] for f in day_forecasts]
+        conditions = [f['weather'][0]['main'] for f in day_forecasts]
+
+        # Знаходимо основний стан погоди
+        main_condition = max(set(conditions), key=conditions.count)
+        temp_day = max(temps)
+        bee_activity, foraging_hours = bee_activity_level(temp_day, main_condition)
+
+        # Сума опадів за день
+        precipitation = sum(f.get('rain', {}).get('3h', 0) for f in day_forecasts if f.get('rain'))
+
+        forecast.append({
+            'date': day,
+            'temp_day': round(temp_day, 1),
+            'temp_night': round(min(temps), 1),
+            'humidity': round(sum(humidities) / len(humidities), 1),
+            'wind_speed': round(sum(winds) / len(winds), 1),
+            'precipitation': round(precipitation, 1),
+            'condition': main_condition.lower(),
+            'bee_activity': bee_activity,
+            'foraging_hours': foraging_hours
+        })
+    return forecast
+
+
+class SharedCache:
+    """Кеш у файлі SQLite, спільний для воркерів хоста: ключ -> (значення JSON, час запису).
+
+    Окремо зберігається час останнього запиту кожного ключа, щоб фоновий оновлювач
+    процесу-лідера знав, що запитували користувачі інших воркерів. Записи, старші
+    за max_age, періодично видаляються.
+    """
+
+    def __init__(self, path, max_age=86400, touch_interval=60, prune_every=1000):
+        self.path = path
+        self.max_age = max_age
+        self.touch_interval = touch_interval
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS requests (key TEXT PRIMARY KEY, requested_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(key)
+
+    @staticmethod
+    def _decode_key(text):
+        def as_tuple(value):
+            return tuple(as_tuple(v) for v in value) if isinstance(value, list) else value
+        return as_tuple(json.loads(text))
+
+    def get(self, key):
+        """(значення, час запису) або None"""
+        row = self._connect().execute('SELECT value, stored_at FROM entries WHERE key = ?',
+                                      (self._encode_key(key),)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def stored_at(self, key):
+        row = self._connect().execute('SELECT stored_at FROM entries WHERE key = ?',
+                                      (self._encode_key(key),)).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value, stored_at):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries (key, value, stored_at) VALUES (?, ?, ?)',
+                         (self._encode_key(key), json.dumps(value, ensure_ascii=False), stored_at))
+        with self._lock:
+            self._sets += 1
+            prune = self._sets % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def touch(self, key):
+        """Запам'ятовує запит ключа (не частіше за touch_interval с з одного процесу)"""
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(key, 0) < self.touch_interval:
+                return
+            self._touched[key] = now
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO requests (key, requested_at) VALUES (?, ?)',
+                         (self._encode_key(key), now))
+
+    def requested(self, since):
+        """Ключі, запитані після since: {ключ: час запиту}"""
+        rows = self._connect().execute('SELECT key, requested_at FROM requests WHERE requested_at >= ?', (since,))
+        return {self._decode_key(key): requested_at for key, requested_at in rows}
+
+    def prune(self):
+        cutoff = time.time() - self.max_age
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE stored_at < ?', (cutoff,))
+            conn.execute('DELETE FROM requests WHERE requested_at < ?', (cutoff,))
+        with self._lock:
+            self._touched = {k: t for k, t in self._touched.items() if t >= cutoff}
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'path': self.path,
+            'entries': conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0],
+            'requests': conn.execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+        }
+
+
+class TTLCache:
+    """LRU-кеш із терміном життя: при переповненні витісняється найдавніший за використанням запис.
+
+    Термін життя передається під час читання, тому в одному кеші можуть жити
+    дані з різними TTL (поточна погода та прогноз). Якщо задано shared
+    (SharedCache), записи дублюються в нього, а відсутній чи застарілий запис
+    шукається там - так воркери бачать дані, отримані іншими процесами.
+    """
+
+    def __init__(self, max_entries=1024, shared=None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self.evictions = 0
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _shared(self, method, *args):
+        """Виклик спільного кешу; помилка SQLite вважається промахом"""
+        try:
+            return getattr(self.shared, method)(*args)
+        except sqlite3.Error as e:
+            self.shared_errors += 1
+            print(f"⚠️ Помилка спільного кешу: {e}")
+            return None
+
+    def _entry(self, key, max_age, promote=True):
+        """Запис (значення, час запису) не старший за max_age, якщо він є локально чи в спільному кеші"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[1] <= max_age or self.shared is None:
+            return entry
+        found = self._shared('get', key)
+        if found is None or (entry is not None and found[1] <= entry[1]):
+            return entry
+        with self._lock:
+            self.shared_hits += 1
+            if promote:
+                current = self._entries.get(key)
+                if current is None or current[1] < found[1]:
+                    self._store(key, found)
+        return found
+
+    def get(self, key, ttl):
+        """Повертає (значення, вік у секундах) або None, якщо запису немає чи він застарів"""
+        entry = self._entry(key, ttl)
+        with self._lock:
+            if entry is None or time.time() - entry[1] > ttl:
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], time.time() - entry[1]
+
+    def get_stale(self, key, max_age):
+        """Повертає (значення, вік) навіть для застарілого запису, якщо він не старший за max_age"""
+        entry = self._entry(key, max_age)
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        with self._lock:
+            self.stale_hits += 1
+        return entry[0], time.time() - entry[1]
+
+    def peek(self, key, max_age):
+        """Значення не старше за max_age або None (без впливу на лічильники та LRU)"""
+        entry = self._entry(key, max_age, promote=False)
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def stored_at(self, key):
+        """Час запису або None, якщо його немає (без впливу на лічильники та LRU)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        local = entry[1] if entry is not None else None
+        shared = self._shared('stored_at', key) if self.shared is not None else None
+        return max((t for t in (local, shared) if t is not None), default=None)
+
+    def age(self, key):
+        """Вік запису в секундах або None, якщо його немає (без впливу на лічильники та LRU)"""
+        stored_at = self.stored_at(key)
+        return None if stored_at is None else time.time() - stored_at
+
+    def set(self, key, value, local=True):
+        """Кладе значення в кеш; local=False - лише в спільний кеш (фонове оновлення
+        не витісняє локальні записи, які запитують користувачі цього процесу)"""
+        stored_at = time.time()
+        if local or self.shared is None:
+            with self._lock:
+                self._store(key, (value, stored_at))
+        if self.shared is not None:
+            self._shared('set', key, value, stored_at)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'shared_hits': self.shared_hits,
+            'shared_errors': self.shared_errors,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+            'shared': self._shared('stats') if self.shared is not None else None
+        }
+
+
+class CircuitBreaker:
+    """Запобіжник для зовнішнього API: після кількох невдач поспіль запити не виконуються.
+
+    Стан 'open' триває reset_timeout секунд, далі пропускається один пробний
+    запит ('half_open'): успіх закриває запобіжник, невдача знову відкриває.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = 'closed'
+        self._opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self._state == 'open' and time.time() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return self._state
+
+    def allow(self):
+        """Чи можна виконати запит зараз"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probing:
+                self._state = 'half_open'
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._probing = False
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self.trips += 1
+                self._state = 'open'
+                self._opened_at = time.time()
+                self._probing = False
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout': self.reset_timeout,
+            'retry_in_seconds': round(max(0, self._opened_at + self.reset_timeout - time.time()), 1)
+            if self._state == 'open' else None,
+            'trips': self.trips,
+            'rejected': self.rejected
+        }
+
+
+class SingleFlight:
+    """Об'єднує одночасні однакові запити: виконується лише перший, решта чекають на його результат"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(), 'result': None, 'error': None}
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls),
+            'executed': self.executed,
+            'coalesced': self.coalesced
+        }
+
+
+class BackgroundRefresher:
+    """Фоновий потік, що періодично оновлює кеш для відомих локацій до того, як записи застаріють.
+
+    Ключі беруться з known_keys() та з нещодавніх запитів; першими оновлюються ті,
+    що запитувалися найпізніше. refresh(key) сам вирішує, чи потрібен запит до API,
+    і лише ставить запити в чергу, повертаючи їхні futures: цикл подає хвилю з
+    batch_size ключів і тільки тоді чекає на неї. Якщо задано leader (LeaderLock),
+    цикли виконує лише процес-лідер, щоб воркери не дублювали запити до API;
+    тоді запити інших воркерів він дізнається зі спільного кешу shared (SharedCache).
+    max_keys обмежує цикл першими ключами за пріоритетом - щоб оновлення не
+    витісняло одне одного з кешу обмеженого розміру.
+    """
+
+    def __init__(self, refresh, known_keys, interval=60, forget_after=86400, batch_size=100, leader=None,
+                 shared=None, max_keys=None):
+        self.refresh = refresh
+        self.known_keys = known_keys
+        self.interval = interval
+        self.forget_after = forget_after
+        self.batch_size = max(1, batch_size)
+        self.leader = leader
+        self.shared = shared
+        self.max_keys = max_keys
+        self._requested = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.errors = 0
+        self.last_cycle_seconds = None
+
+    def touch(self, key):
+        """Запам'ятовує час останнього запиту ключа"""
+        with self._lock:
+            self._requested[key] = time.time()
+        if self.shared is not None:
+            try:
+                self.shared.touch(key)
+            except sqlite3.Error as e:
+                print(f"⚠️ Помилка спільного кешу: {e}")
+
+    def prioritized_keys(self):
+        """Ключі для оновлення: спершу нещодавно запитані (у будь-якому воркері), далі решта відомих"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, t in self._requested.items() if now - t > self.forget_after]:
+                del self._requested[key]
+            requested = dict(self._requested)
+        if self.shared is not None:
+            for key, requested_at in self.shared.requested(now - self.forget_after).items():
+                requested[key] = max(requested_at, requested.get(key, 0))
+
+        keys = set(requested)
+        keys.update(self.known_keys())
+        return sorted(keys, key=lambda k: requested.get(k, 0), reverse=True)
+
+    def run_once(self):
+        started = time.time()
+        keys = self.prioritized_keys()[:self.max_keys]
+        for start in range(0, len(keys), self.batch_size):
+            if self._stop.is_set():
+                break
+            wave = []
+            for key in keys[start:start + self.batch_size]:
+                try:
+                    wave.append((key, self.refresh(key) or []))
+                except Exception as e:
+                    self.errors += 1
+                    print(f"⚠️ Помилка фонового оновлення {key}: {e}")
+            for key, futures in wave:
+                try:
+                    for future in futures:
+                        future.result()
+                    if futures:
+                        self.refreshed += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"⚠️ Помилка фонового оновлення {key}: {e}")
+        self.cycles += 1
+        self.last_cycle_seconds = round(time.time() - started, 3)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.leader is None or self.leader.acquire():
+                    self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Помилка фонового оновлення: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Запускає потік (повторні виклики нічого не роблять)"""
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='weather-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'leader': self.leader is None or self.leader.held,
+            'interval': self.interval,
+            'batch_size': self.batch_size,
+            'max_keys': self.max_keys,
+            'tracked_requests': len(self._requested),
+            'cycles': self.cycles,
+            'refreshed': self.refreshed,
+            'errors': self.errors,
+            'last_cycle_seconds': self.last_cycle_seconds
+        }